@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+G28 - benchmarks for the table generators in datagenerationcodes.py
+"""
+
+# Run every generator at 1k, 100k and 1M rows and compare against the saved baseline
+#   python benchmark.py
+# Save the results as the new baseline
+#   python benchmark.py --save
+# Quick run of a few tables
+#   python benchmark.py --tables customer order --sizes 1000 10000
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import datagenerationcodes
+
+# Where the baseline results are kept
+default_baseline = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# Row counts every generator is run at
+default_sizes = [1_000, 100_000, 1_000_000]
+
+# Allowed slowdown (or growth in peak memory) against the baseline before the run fails
+default_threshold = 0.2
+
+# Runs shorter than this are too noisy to compare throughput on
+min_seconds = 0.05
+
+
+# Function to run one generator in this process and measure it
+def run_one(engine, table, num_rows, output_dir):
+    generator, filename = datagenerationcodes.table_generators[table]
+    filename = os.path.join(output_dir, filename)
+
+    # Build the Faker generator before the clock starts, it is a one-off cost per process
+    datagenerationcodes.fake.seed_instance(0)
+
+    # Likewise build the pool cache the batch engine draws customer text from, so a cold cache is not timed
+    if engine == 'batched' and table == 'customer':
+        datagenerationcodes.load_pools(seed=0, pool_size=datagenerationcodes.batch_pool_size)
+
+    # Every shipment needs an order of its own, so the order keys cover num_rows shipments
+    keys = datagenerationcodes.default_keys({'order': 2 * num_rows})
+
+    start = time.perf_counter()
+    if engine == 'batched':
+        datagenerationcodes.generate_batched(table, filename, num_rows, seed=0, keys=keys)
+    else:
+        generator(filename, num_rows, keys)
+    seconds = time.perf_counter() - start
+
+    # Count the rows actually in the file, so the rate is measured on what was written
+    with open(filename, 'rb') as csvfile:
+        rows_written = sum(1 for _ in csvfile) - 1
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss *= 1 if sys.platform == 'darwin' else 1024
+
+    return {
+        'rows': rows_written,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows_written / seconds, 1) if seconds else 0.0,
+        'peak_rss_bytes': peak_rss,
+        'bytes_written': os.path.getsize(filename),
+    }
+
+# Function to run one generator in a fresh interpreter, so its peak memory is its own
+def run_isolated(engine, table, num_rows):
+    with tempfile.TemporaryDirectory() as output_dir:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--run-one', engine, table, str(num_rows), output_dir],
+            check=True, capture_output=True, text=True)
+    return json.loads(completed.stdout)
+
+# Function to find the results that got worse than the baseline by more than threshold
+def regressions(results, baseline, threshold):
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        timed = min(result['seconds'], before['seconds']) >= min_seconds
+        if timed and result['rows_per_sec'] < before['rows_per_sec'] * (1 - threshold):
+            found.append(f"{name}: {result['rows_per_sec']:.0f} rows/sec, baseline {before['rows_per_sec']:.0f}")
+        if result['peak_rss_bytes'] > before['peak_rss_bytes'] * (1 + threshold):
+            found.append(f"{name}: peak RSS {result['peak_rss_bytes'] / 2**20:.1f} MiB, baseline {before['peak_rss_bytes'] / 2**20:.1f} MiB")
+    return found
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the table generators.')
+    parser.add_argument('--tables', nargs='+', choices=list(datagenerationcodes.table_generators), default=list(datagenerationcodes.table_generators))
+    parser.add_argument('--sizes', nargs='+', type=int, default=default_sizes)
+    parser.add_argument('--engine', choices=['rows', 'batched'], default='rows', help='per-row generators or the batch column engine')
+    parser.add_argument('--baseline', default=default_baseline, help='JSON file holding the baseline results')
+    parser.add_argument('--threshold', type=float, default=default_threshold, help='allowed regression as a fraction, e.g. 0.2 for 20%%')
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline instead of comparing')
+    parser.add_argument('--run-one', nargs=4, metavar=('ENGINE', 'TABLE', 'ROWS', 'DIR'), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.run_one:
+        engine, table, num_rows, output_dir = args.run_one
+        print(json.dumps(run_one(engine, table, int(num_rows), output_dir)))
+        return 0
+
+    results = {}
+    for table in args.tables:
+        # The batch engine does not cover every table; those fall back to the row generators
+        engine = args.engine if args.engine == 'rows' or table in datagenerationcodes.batched_tables else 'rows'
+        for num_rows in args.sizes:
+            name = f'{engine}/{table}/{num_rows}'
+            results[name] = run_isolated(engine, table, num_rows)
+            result = results[name]
+            print(f"{name:<28} {result['rows']:>9} rows {result['seconds']:>9.3f} s {result['rows_per_sec']:>12,.0f} rows/sec "
+                  f"{result['peak_rss_bytes'] / 2**20:>8.1f} MiB RSS {result['bytes_written'] / 2**20:>8.1f} MiB written")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    if args.save:
+        baseline.setdefault('results', {}).update(results)
+        baseline['machine'] = {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor()}
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+
+    found = regressions(results, baseline.get('results', {}), args.threshold)
+    for regression in found:
+        print(f'REGRESSION {regression}')
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,18 +6,577 @@ G28
 # install faker library
 # pip install Faker
 
+# optional, for Parquet/Arrow output
+# pip install pyarrow
+
+# optional, for zstd compressed CSV output
+# pip install zstandard
+
 # csv library
 import csv
 
+# array and bisect for the sorted id numbers of key indexes with gaps
+from array import array
+import bisect
+
+# contextlib for the id width context manager
+import contextlib
+
+# argparse for the command line entry point
+import argparse
+
+# sys for writing progress to stderr
+import sys
+
+# importlib for loading numpy on first use
+import importlib
+
+# math for the scale factor
+import math
+
+# itertools for slicing row streams into batches
+import itertools
+
+# os and shutil libraries for shard part files and the pool cache
+import os
+import shutil
+
 # random library
 import random
 
+# re for the column formats checked by the validation
+import re
+
+# sqlite3 for loading rows straight into Ecommerce.db
+import sqlite3
+
+# namedtuple for typed row tuples, deque for keeping the last line of a compressed file
+from collections import deque, namedtuple
+
+# time for the instrumentation timers
+import time
+
+# gzip, zlib, io, queue and threading for the background block writer
+import gzip
+import io
+import queue
+import threading
+import zlib
+
 # datetime
 from datetime import datetime, timedelta
 
+
+# Stand-in that only builds the real object the first time one of its attributes is used,
+# so importing this module does no Faker set-up and no numpy import
+class Lazy:
+    def __init__(self, factory):
+        self.factory = factory
+        self.target = None
+
+    def __getattr__(self, name):
+        if self.target is None:
+            self.target = self.factory()
+        return getattr(self.target, name)
+
+# Function to build a new faker generator
+def new_faker(locale=None):
+    from faker import Faker
+    return Faker(locale)
+
+# numpy for batch column generation
+np = Lazy(lambda: importlib.import_module('numpy'))
+
+# pyarrow for Parquet/Arrow output
+pa = Lazy(lambda: importlib.import_module('pyarrow'))
+pc = Lazy(lambda: importlib.import_module('pyarrow.compute'))
+pq = Lazy(lambda: importlib.import_module('pyarrow.parquet'))
+
+# zstandard for .zst output
+zstd = Lazy(lambda: importlib.import_module('zstandard'))
+
 # inititalise faker generator
-from faker import Faker
-fake = Faker()
+fake = Lazy(new_faker)
+
+
+# %% key indexes
+
+# Id prefix and number width of every table's key
+key_formats = {
+    'customer': ('c', 5),
+    'seller': ('s', 5),
+    'category': ('c', 2),
+    'product': ('p', 3),
+    'discount': ('d', 5),
+    'order': ('on', 5),
+    'shipment': ('sh', 5),
+}
+
+# Keys of a parent table that child tables draw their foreign keys from
+# The id numbers are kept as a range, or as a sorted array when they have gaps, so any position is found and sampled in O(1)
+class KeyIndex:
+    def __init__(self, table, numbers):
+        self.prefix, self.width = key_formats[table]
+        self.numbers = numbers
+
+    def __len__(self):
+        return len(self.numbers)
+
+    # Key at a position, e.g. key(0) == 'c00001'
+    def key(self, position):
+        return f'{self.prefix}{self.numbers[position]:0{self.width}}'
+
+    # Whether a key such as 'c00042' is in the index, written exactly as key() writes it
+    # The width counts too, so 'c00001' is not a category key (c01) and 's1' is not a seller key (s00001)
+    def __contains__(self, key):
+        digits = key[len(self.prefix):]
+        if not (key.startswith(self.prefix) and digits.isdigit()):
+            return False
+        number = int(digits)
+        return self.has_number(number) and key == f'{self.prefix}{number:0{self.width}}'
+
+    # Whether an id number is in the index, by binary search when the numbers are an array
+    def has_number(self, number):
+        if isinstance(self.numbers, range):
+            return number in self.numbers
+        position = bisect.bisect_left(self.numbers, number)
+        return position < len(self.numbers) and self.numbers[position] == number
+
+    # Random key, optionally from the positions [lo, hi) only
+    def sample(self, rng, lo=0, hi=None):
+        return self.key(rng.randrange(lo, len(self) if hi is None else hi))
+
+    # Id numbers at an array of positions
+    def numbers_at(self, positions):
+        if isinstance(self.numbers, range):
+            return self.numbers.start + positions * self.numbers.step
+        return np.asarray(self.numbers)[positions]
+
+    # Array of size random id numbers, optionally from the positions [lo, hi) only
+    def sample_numbers(self, np_rng, size, lo=0, hi=None):
+        return self.numbers_at(np_rng.integers(lo, len(self) if hi is None else hi, size=size))
+
+# Function to build the key index of a table whose ids run from 1 to last_id_num
+def key_index(table, last_id_num):
+    return KeyIndex(table, range(1, last_id_num + 1))
+
+# Function to build the key index of the ids a table actually holds, e.g. ['c00501', 'c00502']
+# Ids running from 1 without gaps are kept as a range, any others as a sorted array
+def ids_key_index(table, ids):
+    numbers = sorted({id_num(table, row_id) for row_id in ids})
+    if not numbers or (numbers[0] == 1 and numbers[-1] == len(numbers)):
+        return key_index(table, len(numbers))
+    return KeyIndex(table, array('q', numbers))
+
+# Function to find the highest id number a table has after generating num_rows rows
+def last_id_for_rows(table, num_rows):
+    # Order rows 1..100 hold orders on00001..on00050 in pairs, after that row n holds order n - 50
+    if table == 'order':
+        return (num_rows + 1) // 2 if num_rows <= 100 else num_rows - 50
+    return num_rows
+
+# Function to build the key indexes of every table from row counts ({table: num_rows}),
+# falling back to the default row count for tables that are not given
+def default_keys(tables=None):
+    tables = {**default_config['tables'], **(tables or {})}
+    return {table: key_index(table, last_id_for_rows(table, num_rows)) for table, num_rows in tables.items()}
+
+
+# %% formatting
+
+# Tables whose ids have five digits by default; set_id_width widens them past 99,999 rows
+# They are also the tables --delta extends with new rows
+id_width_tables = ('customer', 'seller', 'discount', 'order', 'shipment')
+
+# Function to set the id number width of the five-digit tables, e.g. 7 for up to 9,999,999 customers or orders
+# Key indexes built before the change keep the old width
+def set_id_width(width):
+    for table in id_width_tables:
+        key_formats[table] = (key_formats[table][0], width)
+
+# Function to widen the id numbers of the tables in tables ({table: num_rows}) to fit their highest id
+# A shipment count of None means one shipment per order
+def fit_id_widths(tables):
+    for table, num_rows in tables.items():
+        if num_rows is None:
+            num_rows = last_id_for_rows('order', tables.get('order', 0))
+        prefix, width = key_formats[table]
+        key_formats[table] = (prefix, max(width, len(str(last_id_for_rows(table, num_rows)))))
+
+# Function to set the id widths a config asks for: wide enough for its row counts at a scale factor, or config['id_width']
+def apply_id_widths(config):
+    if config['scale_factor']:
+        fit_id_widths(config['tables'])
+    if config['id_width']:
+        set_id_width(config['id_width'])
+
+# Context manager applying the id widths a config asks for (see apply_id_widths) and restoring the previous widths afterwards,
+# so one run's widths do not leak into the next one in the same process
+@contextlib.contextmanager
+def id_widths(config):
+    saved = dict(key_formats)
+    apply_id_widths(config)
+    try:
+        yield
+    finally:
+        key_formats.update(saved)
+
+# Function to build the %-format of a table's ids, e.g. 'c%05d' for customers
+# The row generators build it once and format every id with a single % operation
+def id_format(table):
+    prefix, width = key_formats[table]
+    return f'{prefix}%0{width}d'
+
+# Days before today of the '-1y'..'now' window of order and discount dates, as [first, stop)
+last_year_days = (0, 366)
+
+# Function to find the date a number of years before a day, 29 February falling back to the 28th
+def years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+# Function to find the days before today of the dates of birth of customers aged min_age to max_age, as [first, stop)
+# The ages are counted in calendar years, so leap days are taken into account
+def birth_days(min_age=35, max_age=60):
+    today = datetime.now().date()
+    return (today - years_before(today, min_age)).days, (today - years_before(today, max_age + 1)).days
+
+# Date strings already built, by (first, stop, date_format, today)
+date_tables = {}
+
+# Function to list the dates first..stop-1 days before today as strings in date_format, built once per day,
+# so a date is picked by index instead of drawing it with Faker and formatting it with strftime for every row
+def date_table(first, stop, date_format='%Y-%m-%d'):
+    today = datetime.now().date()
+    key = (first, stop, date_format, today)
+    if key not in date_tables:
+        date_tables[key] = [(today - timedelta(days=days)).strftime(date_format) for days in range(first, stop)]
+    return date_tables[key]
+
+# Function to format an array of day offsets (days before today, within [first, stop)) in bulk through a date table
+def format_dates(days, first, stop, date_format='%Y-%m-%d'):
+    return list(map(date_table(first, stop, date_format).__getitem__, (days - first).tolist()))
+
+
+# %% name pools
+
+# Faker providers that customer() and seller() call for every row
+pool_providers = ['first_name', 'first_name_male', 'first_name_female', 'last_name', 'street_address', 'zipcode', 'company']
+
+# Directory the pools are cached in, one sub-directory per (locale, seed, pool_size)
+pool_cache_dir = os.environ.get('DM28_POOL_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'dm28', 'pools'))
+
+# Strings kept as one UTF-8 blob plus an offsets array, so a pool loads memory-mapped and any string is found by index
+class StringPool:
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+        self.strings = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    # Random string from the pool
+    def sample(self, rng):
+        return self[rng.randrange(len(self))]
+
+    # Every string of the pool as a numpy array, for the batch engine
+    def array(self):
+        if self.strings is None:
+            self.strings = np.array([self[index] for index in range(len(self))])
+        return self.strings
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def save(self, path):
+        np.save(f'{path}.data.npy', self.data)
+        np.save(f'{path}.offsets.npy', self.offsets)
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(f'{path}.data.npy', mmap_mode='r'), np.load(f'{path}.offsets.npy', mmap_mode='r'))
+
+# Function to load the name/street/zip code/company pools for a locale and seed,
+# generating them with Faker and caching them on disk the first time only
+def load_pools(locale='en_US', seed=0, pool_size=10_000):
+    cache_dir = os.path.join(pool_cache_dir, f'{locale}-{seed}-{pool_size}')
+
+    if not os.path.isdir(cache_dir):
+        pool_fake = new_faker(locale)
+        pool_fake.seed_instance(seed)
+
+        # Write into a temporary directory and rename it, so concurrent runs never see a half-written cache
+        temp_dir = f'{cache_dir}.{os.getpid()}.tmp'
+        os.makedirs(temp_dir, exist_ok=True)
+        for provider in pool_providers:
+            make = getattr(pool_fake, provider)
+            StringPool.from_strings([make() for _ in range(pool_size)]).save(os.path.join(temp_dir, provider))
+        try:
+            os.rename(temp_dir, cache_dir)
+        except OSError:
+            shutil.rmtree(temp_dir)
+
+    return {provider: StringPool.load(os.path.join(cache_dir, provider)) for provider in pool_providers}
+
+# Stand-in for a faker generator whose name, street, zip code and company providers draw from pools by index
+# Every other provider is passed through to the real generator
+class PoolFaker:
+    def __init__(self, pools, fake):
+        self.pools = pools
+        self.fake = fake
+
+    def __getattr__(self, name):
+        if name in self.pools:
+            pool = self.pools[name]
+            return lambda: pool.sample(self.fake.random)
+        return getattr(self.fake, name)
+
+
+# %% background writer
+
+# Rows encoded per block handed to the writer thread
+block_rows = 10_000
+
+# Blocks that may wait for the writer thread before generation pauses
+block_queue_depth = 8
+
+# Function to build the gzip or zstd compressor for a file name ending in .gz or .zst (None for anything else)
+# Each block is compressed in one call, so the writer thread gives up the GIL once per block rather than once per 128KB
+def new_compressor(filename):
+    if filename.endswith('.gz'):
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if filename.endswith('.zst'):
+        return zstd.ZstdCompressor().compressobj()
+    return None
+
+# Function to open a file written by a BlockWriter for reading as text
+def open_input(filename):
+    if filename.endswith('.gz'):
+        return gzip.open(filename, 'rt', newline='')
+    if filename.endswith('.zst'):
+        return io.TextIOWrapper(zstd.ZstdDecompressor().stream_reader(open(filename, 'rb'), closefd=True), newline='')
+    return open(filename, 'r', newline='')
+
+# Writes blocks of encoded rows to a file from a background thread, so generation carries on while
+# the previous blocks are compressed and written
+class BlockWriter:
+    def __init__(self, filename):
+        self.file = open(filename, 'wb')
+        self.compressor = new_compressor(filename)
+        self.blocks = queue.Queue(block_queue_depth)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            while (block := self.blocks.get()) is not None:
+                self.file.write(self.compressor.compress(block) if self.compressor else block)
+            if self.compressor:
+                self.file.write(self.compressor.flush())
+        except BaseException as error:
+            self.error = error
+            # Keep taking blocks so the generating thread is never left waiting on a full queue
+            while self.blocks.get() is not None:
+                pass
+        finally:
+            self.file.close()
+
+    def write(self, block):
+        if self.error is not None:
+            raise self.error
+        self.blocks.put(block)
+
+    def close(self):
+        self.blocks.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Function to encode rows as CSV text in blocks of block_rows and hand them to a BlockWriter
+# Rows are plain tuples in column order, so they are written positionally with no per-field lookups
+def write_blocks(blocks, fieldnames, rows, header=True):
+    buffer = io.StringIO()
+    csvwriter = csv.writer(buffer)
+
+    # Write the header
+    if header:
+        csvwriter.writerow(fieldnames)
+
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, block_rows))
+        csvwriter.writerows(chunk)
+        flush_block(blocks, buffer)
+        if len(chunk) < block_rows:
+            break
+
+# Function to hand the text encoded in buffer to a BlockWriter and empty the buffer
+def flush_block(blocks, buffer):
+    if buffer.tell():
+        blocks.write(buffer.getvalue().encode('utf-8'))
+        buffer.seek(0)
+        buffer.truncate()
+
+
+# %% instrumentation
+
+# Metrics sink the generators report to; None (the default) turns instrumentation off at no cost
+metrics = None
+
+# Collects per-stage timings and call counts, and passes progress events to a callback
+# Stages are '<table>.faker.<provider>', '<table>.random.<method>', '<table>.rows' (time spent producing rows),
+# '<table>.disk.write' (time spent waiting for the writer thread) and '<table>.total'
+class Metrics:
+    def __init__(self, callback=None, every=100_000):
+        self.callback = callback
+        self.every = every
+        self.timings = {}
+        self.calls = {}
+
+    def add(self, stage, seconds, calls=1):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    def emit(self, **event):
+        if self.callback is not None:
+            self.callback(event)
+
+    # Per-table breakdown: Faker providers, random draws, formatting (the rest of producing rows),
+    # csv encoding (the rest of writing, Arrow conversion for Parquet) and disk writes
+    def breakdown(self, table):
+        def total(prefix):
+            return sum(seconds for stage, seconds in self.timings.items() if stage.startswith(prefix))
+        faker, rng, rows, disk = total(f'{table}.faker.'), total(f'{table}.random.'), total(f'{table}.rows'), total(f'{table}.disk.')
+        return {
+            'faker': faker,
+            'random': rng,
+            'format': max(rows - faker - rng, 0.0),
+            'csv': max(total(f'{table}.total') - rows - disk, 0.0),
+            'disk': disk,
+        }
+
+# Types of attribute values Timed hands back as they are
+plain_types = (str, bytes, int, float, bool, type(None), tuple, list, dict, set, frozenset)
+
+# Stand-in that times every method call of the wrapped object under '<prefix>.<method>'
+# Objects reached through its attributes, such as fake.random, are timed too, under '<prefix>.<attribute>.<method>'
+class Timed:
+    def __init__(self, target, metrics, prefix):
+        # A Lazy target is built here, so its one-off set-up is not counted as part of the first timed call
+        if isinstance(target, Lazy):
+            if target.target is None:
+                target.target = target.factory()
+            target = target.target
+
+        self.target = target
+        self.metrics = metrics
+        self.prefix = prefix
+
+    def __getattr__(self, name):
+        attribute = getattr(self.target, name)
+        if isinstance(attribute, plain_types):
+            return attribute
+        if not callable(attribute):
+            return Timed(attribute, self.metrics, f'{self.prefix}.{name}')
+
+        stage = f'{self.prefix}.{name}'
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                self.metrics.add(stage, time.perf_counter() - start)
+        return timed
+
+# Function to time a row generator, count its rows and emit a progress event every metrics.every rows
+def timed_rows(rows, metrics, table):
+    rows = iter(rows)
+    num_rows = 0
+    producing = 0.0
+    started = time.perf_counter()
+
+    while True:
+        start = time.perf_counter()
+        try:
+            row = next(rows)
+        except StopIteration:
+            break
+        producing += time.perf_counter() - start
+
+        yield row
+        num_rows += 1
+        if num_rows % metrics.every == 0:
+            elapsed = time.perf_counter() - started
+            metrics.emit(event='progress', table=table, rows=num_rows, seconds=elapsed, rows_per_sec=num_rows / elapsed)
+
+    metrics.add(f'{table}.rows', producing, num_rows)
+
+# Function to time a stream of column batches ({column: values}) like timed_rows, counting the rows in each batch
+def timed_batches(batches, metrics, table):
+    batches = iter(batches)
+    num_rows = 0
+    producing = 0.0
+    started = time.perf_counter()
+
+    while True:
+        start = time.perf_counter()
+        try:
+            columns = next(batches)
+        except StopIteration:
+            break
+        producing += time.perf_counter() - start
+
+        yield columns
+        batch_rows = len(next(iter(columns.values()), ()))
+        num_rows += batch_rows
+        if num_rows // metrics.every > (num_rows - batch_rows) // metrics.every:
+            elapsed = time.perf_counter() - started
+            metrics.emit(event='progress', table=table, rows=num_rows, seconds=elapsed, rows_per_sec=num_rows / elapsed)
+
+    metrics.add(f'{table}.rows', producing, num_rows)
+
+# Function to record the total time of writing a table since started and emit its done event
+def table_done(metrics, table, started):
+    seconds = time.perf_counter() - started
+    metrics.add(f'{table}.total', seconds)
+    metrics.emit(event='done', table=table, rows=metrics.calls.get(f'{table}.rows', 0), seconds=seconds, breakdown=metrics.breakdown(table))
+
+# Function to write a table's rows to a CSV file (compressed for .gz and .zst names), instrumented when metrics is set
+# Rows are encoded on this thread and written by a BlockWriter thread, so generation and disk I/O overlap
+def write_table(filename, table, fieldnames, rows, num_rows, fake, rng, keys):
+    if metrics is not None:
+        fake = Timed(fake, metrics, f'{table}.faker')
+        rng = Timed(rng, metrics, f'{table}.random')
+    started = time.perf_counter()
+
+    with BlockWriter(filename) as blocks:
+        table_rows = rows(1, num_rows + 1, fake, rng, keys)
+        if metrics is not None:
+            blocks = Timed(blocks, metrics, f'{table}.disk')
+            table_rows = timed_rows(table_rows, metrics, table)
+        if validation is not None:
+            table_rows = validated_rows(table_rows, Validator(table, validation_keys, validation))
+        write_blocks(blocks, fieldnames, table_rows)
+
+    if metrics is not None:
+        table_done(metrics, table, started)
 
 
 # %% customer
@@ -38,46 +597,46 @@ def get_country_info_cust(country_code):
     else:
         return 'Unknown'
 
-def customer(filename, num_customers=500):
-    fieldnames = ['customer_id', 'first_name', 'last_name', 'gender', 'date_of_birth', 'email', 'phone', 'customer_street', 'customer_country', 'customer_zip_code', 'platform']
-
-    with open(filename, 'w', newline='') as csvfile:
-        csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames)
+customer_fieldnames = ['customer_id', 'first_name', 'last_name', 'gender', 'date_of_birth', 'email', 'phone', 'customer_street', 'customer_country', 'customer_zip_code', 'platform']
+
+# Function to generate customer rows for the id range [start, stop)
+def customer_rows(start, stop, fake, rng, keys=None):
+    customer_id_format = id_format('customer')
+    birth_dates = date_table(*birth_days(), '%d/%m/%Y')
+
+    for customer_id_num in range(start, stop):
+        customer_id = customer_id_format % customer_id_num  # Format customer_id as 'c' followed by 5-digit number
+        gender = fake.random_element(elements=('Male', 'Female', 'Other'))
+        first_name = fake.first_name_male() if gender == 'Male' else fake.first_name_female()
+        last_name = fake.last_name()
+        email = f"{first_name.lower()}_{last_name.lower()}@gmail.com"
+        country_code = fake.random_element(elements=country_codes)
+        phone = f"({country_code}){fake.random_number(digits=10, fix_len=True)}"
+        customer_street = fake.street_address()
+        customer_country = get_country_info_cust(country_code)
+        customer_zip_code = fake.zipcode()
+        date_of_birth = rng.choice(birth_dates)  # Aged between 35 and 60
+        platform = fake.random_element(elements=('Facebook', 'Instagram', 'Referral', 'Others'))
         
-        # Write the header
-        csvwriter.writeheader()
-
-        # Generate and write fake data to the CSV file
-        for customer_id_num in range(1, num_customers + 1):
-            customer_id = f'c{customer_id_num:05}'  # Format customer_id as 'c' followed by 5-digit number
-            gender = fake.random_element(elements=('Male', 'Female', 'Other'))
-            first_name = fake.first_name_male() if gender == 'Male' else fake.first_name_female()
-            last_name = fake.last_name()
-            email = f"{first_name.lower()}_{last_name.lower()}@gmail.com"
-            country_code = fake.random_element(elements=country_codes)
-            phone = f"({country_code}){fake.random_number(digits=10, fix_len=True)}"
-            customer_street = fake.street_address()
-            customer_country = get_country_info_cust(country_code)
-            customer_zip_code = fake.zipcode()
-            date_of_birth = fake.date_of_birth(minimum_age=35, maximum_age=60).strftime('%d/%m/%Y')
-            platform = fake.random_element(elements=('Facebook', 'Instagram', 'Referral', 'Others'))
-            
-            csvwriter.writerow({
-                'customer_id': customer_id,
-                'first_name': first_name,
-                'last_name': last_name,
-                'gender': gender,
-                'date_of_birth': date_of_birth,
-                'email': email,
-                'phone': phone,
-                'customer_street': customer_street,
-                'customer_country': customer_country,
-                'customer_zip_code': customer_zip_code,
-                'platform': platform
-            })
-
-# Call the function to generate and save fake customer data to a CSV file
-customer('customer.csv', num_customers=500)
+        yield (
+            customer_id,
+            first_name,
+            last_name,
+            gender,
+            date_of_birth,
+            email,
+            phone,
+            customer_street,
+            customer_country,
+            customer_zip_code,
+            platform
+        )
+
+# With pools (see load_pools) names, streets and zip codes come from the cached pools instead of Faker
+def customer(filename, num_customers=500, keys=None, pools=None):
+    # Generate and write fake data to the CSV file
+    write_table(filename, 'customer', customer_fieldnames, customer_rows, num_customers, PoolFaker(pools, fake) if pools else fake, random, keys)
+
 
 # %% seller entity
 
@@ -99,39 +658,38 @@ def get_country_info_seller(country_code):
     else:
         return 'Unknown'
 
+seller_fieldnames = ['seller_id', 'company_name', 'supplier_phone', 'supplier_email', 'seller_street', 'seller_country', 'seller_zip_code']
+
+# Function to generate seller rows for the id range [start, stop)
+def seller_rows(start, stop, fake, rng, keys=None):
+    seller_id_format = id_format('seller')
+
+    for seller_id_num in range(start, stop):
+        seller_id = seller_id_format % seller_id_num
+        company_name = fake.company().replace(',', '-High')
+        country_code = rng.choice(country_codes)
+        supplier_phone = f"({country_code}){fake.random_number(digits=10, fix_len=True)}"
+        supplier_email = f"{fake.first_name().lower()}@{company_name.split()[0].lower()}.com"
+        seller_street = fake.street_address()
+        seller_country = get_country_info_seller(country_code)
+        seller_zip_code = fake.zipcode()
+
+        yield (
+            seller_id,
+            company_name,
+            supplier_phone,
+            supplier_email,
+            seller_street,
+            seller_country,
+            seller_zip_code
+        )
+
 # Function to generate fake data and save it to a CSV file
-def seller(filename, num_records=500):
-    fieldnames = ['seller_id', 'company_name', 'supplier_phone', 'supplier_email', 'seller_street', 'seller_country', 'seller_zip_code']
+# With pools (see load_pools) names, streets, zip codes and companies come from the cached pools instead of Faker
+def seller(filename, num_records=500, keys=None, pools=None):
+    # Generate and write fake data to the CSV file
+    write_table(filename, 'seller', seller_fieldnames, seller_rows, num_records, PoolFaker(pools, fake) if pools else fake, random, keys)
 
-    with open(filename, 'w', newline='') as csvfile:
-        csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        # Write the header
-        csvwriter.writeheader()
-
-        # Generate and write fake data to the CSV file
-        for seller_id_num in range(1, num_records + 1):
-            seller_id = f's{seller_id_num:05}'
-            company_name = fake.company().replace(',', '-High')
-            country_code = random.choice(country_codes)
-            supplier_phone = f"({country_code}){fake.random_number(digits=10, fix_len=True)}"
-            supplier_email = f"{fake.first_name().lower()}@{company_name.split()[0].lower()}.com"
-            seller_street = fake.street_address()
-            seller_country = get_country_info_seller(country_code)
-            seller_zip_code = fake.zipcode()
-
-            csvwriter.writerow({
-                'seller_id': seller_id,
-                'company_name': company_name,
-                'supplier_phone': supplier_phone,
-                'supplier_email': supplier_email,
-                'seller_street': seller_street,
-                'seller_country': seller_country,
-                'seller_zip_code': seller_zip_code
-            })
-
-# Call the function to generate and save fake data to a CSV file (500 records)
-seller('seller.csv', num_records=500)
 
 
 # %% product category
@@ -157,46 +715,56 @@ category_descriptions = {
 }
 
 
-# Function to generate categories and save them to a CSV file
-def category(filename, num_categories=17):
-    fieldnames = ['category_id','p_category_id', 'cat_name', 'cat_description']
+category_fieldnames = ['category_id','p_category_id', 'cat_name', 'cat_description']
 
-    with open(filename, 'w', newline='') as csvfile:
-        csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        # Write the header
-        csvwriter.writeheader()
-
-        # Mapping of cat_name to p_category_id
-        p_category_mapping = {
-            "Sportswear": "pc01",
-            "Jewelry": "pc02",
-            "Skincare": "pc03",
-            "Health Supplements": "pc04",
-            "Board Games": "pc05",
-            "Car Engine Products": "pc06",
-            "Gardening Tools": "pc07"
-        }
+# Mapping of cat_name to p_category_id
+p_category_mapping = {
+    "Sportswear": "pc01",
+    "Jewelry": "pc02",
+    "Skincare": "pc03",
+    "Health Supplements": "pc04",
+    "Board Games": "pc05",
+    "Car Engine Products": "pc06",
+    "Gardening Tools": "pc07"
+}
+
+# Sub-lines of the hand-written categories, used to name the categories generated beyond them
+category_lines = ['Essentials', 'Premium', 'Outlet', 'Eco', 'Kids', 'Travel', 'Pro', 'Classic']
+
+category_items = list(category_descriptions.items())
 
-        # Generate and write category data to the CSV file
-        for category_id_num, (cat_name, cat_description) in enumerate(category_descriptions.items(), start=1):
-            category_id = f'c{category_id_num:02}'  # Format category_id as 'c' followed by 2-digit number
+# Function to describe category number category_id_num as (cat_name, cat_description, p_category_id)
+# The hand-written categories come first; after them every category is a sub-line of a hand-written one and its child
+def catalogue_category(category_id_num):
+    level, base = divmod(category_id_num - 1, len(category_items))
+    cat_name, cat_description = category_items[base]
+    if level == 0:
+        # Get the corresponding p_category_id based on cat_name, 'NULL' if not found in the mapping
+        return cat_name, cat_description, p_category_mapping.get(cat_name, 'NULL')
 
-            # Get the corresponding p_category_id based on cat_name
-            p_category_id = p_category_mapping.get(cat_name, None)
+    cycle, line = divmod(level - 1, len(category_lines))
+    cat_name = f'{cat_name} {category_lines[line]}' + (f' {cycle + 1}' if cycle else '')
+    return cat_name, cat_description, id_format('category') % (base + 1)
 
-            # Set p_category_id to 'NULL' if not found in the mapping
-            p_category_id = 'NULL' if p_category_id is None else p_category_id
+# Function to generate category rows for the id range [start, stop)
+def category_rows(start, stop, fake, rng, keys=None):
+    category_id_format = id_format('category')
 
-            csvwriter.writerow({
-                'category_id': category_id,
-                'p_category_id': p_category_id,
-                'cat_name': cat_name,
-                'cat_description': cat_description
-            })
+    for category_id_num in range(start, stop):
+        category_id = category_id_format % category_id_num  # Format category_id as 'c' followed by 2-digit number
+        cat_name, cat_description, p_category_id = catalogue_category(category_id_num)
 
-# Call the function to generate and save category data to a CSV file
-category('category.csv', num_categories=17)
+        yield (
+            category_id,
+            p_category_id,
+            cat_name,
+            cat_description
+        )
+
+# Function to generate categories and save them to a CSV file
+def category(filename, num_categories=17, keys=None):
+    # Generate and write category data to the CSV file
+    write_table(filename, 'category', category_fieldnames, category_rows, num_categories, fake, random, keys)
 
 
 # %% products
@@ -291,94 +859,102 @@ product_list = {
     
 
 }
-def product(filename, num_products=51):
-    fieldnames = ['product_id', 'product_name', 'price', 'product_description', 'inventory', 'weight', 'category_id', 'seller_id', 'product_views']
-
-    with open(filename, 'w', newline='') as csvfile:
-        csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        # Write the header
-        csvwriter.writeheader()
-
-        # Generate and write product data to the CSV file
-        product_id_num = 1
-        product_names_used = set()
-
-        # List to store 10 random seller_ids for duplication
-        random_seller_ids = random.sample(range(1, 501), 10)
-
-        for category, products in product_list.items():
-            category_id = f'c{(product_id_num - 1) // 3 + 1:02}'  # Calculate category_id based on the pattern
-
-            for product_data in products:
-                product_name = product_data["name"]
-                product_description = product_data["description"]
-
-                # Ensure no duplicates in product names
-                while product_name in product_names_used:
-                    product_name = fake.word() + ' ' + fake.word()
-
-                product_names_used.add(product_name)
-
-                product_id = f'p{product_id_num:03}'  # Format product_id as 'p' followed by 3-digit number
-                price = round(random.uniform(1, 150), 1)  # Use round to ensure two decimal places, rounded to the first decimal place
-                inventory = fake.random_int(min=1, max=100)  # Random inventory between 1 and 100
-                weight = round(random.uniform(1.00, 10.00), 2)  # Use random.uniform for weight
-                seller_id = f's{int((product_id_num - 1) / 2) + 1:05}' if product_id_num <= 10 else f's{fake.random_int(min=1, max=500):05}'
-                product_views = fake.random_int(min=500, max=1000)  # Random product views between 500 and 1000
-
-                # Assign category_id based on the pattern
-                csvwriter.writerow({
-                    'product_id': product_id,
-                    'product_name': product_name,
-                    'price': price,
-                    'product_description': product_description,
-                    'inventory': inventory,
-                    'weight': weight,
-                    'category_id': category_id,
-                    'seller_id': seller_id,
-                    'product_views': product_views
-                })
-
-                product_id_num += 1
-
-# Call the function to generate and save product data to a CSV file
-product('product.csv', num_products=51)
+product_fieldnames = ['product_id', 'product_name', 'price', 'product_description', 'inventory', 'weight', 'category_id', 'seller_id', 'product_views']
+
+# Flat (category position, name, description) list of the hand-written products
+product_catalogue = [(category_num, product_data['name'], product_data['description'])
+                     for category_num, products in enumerate(product_list.values(), start=1)
+                     for product_data in products]
+
+# Editions of the catalogue products, used to name the products generated beyond the catalogue
+product_editions = ['Plus', 'Pro', 'Lite', 'Max', 'Mini', 'Sport', 'Home', 'Travel']
+
+# Function to describe product number product_id_num as (category position, name, description) in O(1)
+# The hand-written catalogue comes first; after it every product is an edition of a catalogue product,
+# named uniquely and spread over the sub-lines (see catalogue_category) of the catalogue product's category
+def catalogue_product(product_id_num, num_categories):
+    cycle, base = divmod(product_id_num - 1, len(product_catalogue))
+    category_num, product_name, product_description = product_catalogue[base]
+    if cycle:
+        model, edition = divmod(cycle - 1, len(product_editions))
+        product_name = f'{product_name} {product_editions[edition]}' + (f' {model + 1}' if model else '')
+
+    levels = max(num_categories // len(category_items), 1)
+    category_position = (category_num - 1 + len(category_items) * (cycle % levels)) % num_categories
+    return category_position, product_name, product_description
+
+# Function to generate product rows for the id range [start, stop)
+def product_rows(start, stop, fake, rng, keys=None):
+    keys = keys or default_keys()
+    categories, sellers = keys['category'], keys['seller']
+    product_id_format = id_format('product')
+
+    for product_id_num in range(start, stop):
+        # Names are unique by construction, so no set of used names has to be kept
+        category_position, product_name, product_description = catalogue_product(product_id_num, len(categories))
+        category_id = categories.key(category_position)
+
+        product_id = product_id_format % product_id_num  # Format product_id as 'p' followed by 3-digit number
+        price = round(rng.uniform(1, 150), 1)  # Use round to ensure two decimal places, rounded to the first decimal place
+        inventory = fake.random_int(min=1, max=100)  # Random inventory between 1 and 100
+        weight = round(rng.uniform(1.00, 10.00), 2)  # Use random.uniform for weight
+        # The first 10 products go to the first 5 sellers in pairs, the rest to random sellers
+        seller_id = sellers.key((product_id_num - 1) // 2 % len(sellers)) if product_id_num <= 10 else sellers.sample(rng)
+        product_views = fake.random_int(min=500, max=1000)  # Random product views between 500 and 1000
+
+        yield (
+            product_id,
+            product_name,
+            price,
+            product_description,
+            inventory,
+            weight,
+            category_id,
+            seller_id,
+            product_views
+        )
+
+def product(filename, num_products=51, keys=None):
+    # Generate and write product data to the CSV file
+    write_table(filename, 'product', product_fieldnames, product_rows, num_products, fake, random, keys)
 
 
 # %% discount
-def discount(filename, num_discounts=500):
-    fieldnames = ['discount_id', 'discount_percentage', 'discount_start_date', 'discount_end_date', 'product_id']
-
-    with open(filename, 'w', newline='') as csvfile:
-        csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        # Write the header
-        csvwriter.writeheader()
-
-        # Generate and write discount data to the CSV file
-        for discount_id_num in range(1, num_discounts + 1):
-            discount_id = f'd{discount_id_num:05}'  # Format discount_id as 'd' followed by 5-digit number
-            discount_percentage = min(round(fake.random.randint(1, 15) * 5 / 100, 2), 0.8)  # Random discount percentage in 5% increments, divide by 100
-            start_date = fake.date_between(start_date='-1y', end_date='now')  # Start date within the last year
-            end_date = start_date + timedelta(days=30)  # End date is 1 month after the start date
-
-            # Assign product_id with some random duplication for the first 50 to 100 products
-            if 50 <= discount_id_num <= 100:
-                product_id = f'p{random.randint(20, 30):03}'
-            else:
-                product_id = f'p{random.randint(1, 30):03}'
-
-            csvwriter.writerow({
-                'discount_id': discount_id,
-                'discount_percentage': discount_percentage,
-                'discount_start_date': start_date.strftime('%Y-%m-%d'),
-                'discount_end_date': end_date.strftime('%Y-%m-%d'),
-                'product_id': product_id
-            })
+discount_fieldnames = ['discount_id', 'discount_percentage', 'discount_start_date', 'discount_end_date', 'product_id']
+
+# Function to generate discount rows for the id range [start, stop)
+def discount_rows(start, stop, fake, rng, keys=None):
+    products = (keys or default_keys())['product']
+    discount_id_format = id_format('discount')
+
+    # Dates from 30 days ahead back to a year ago, so the end date 30 days after any start date is in the table too
+    discount_dates = date_table(last_year_days[0] - 30, last_year_days[1])
+
+    for discount_id_num in range(start, stop):
+        discount_id = discount_id_format % discount_id_num  # Format discount_id as 'd' followed by 5-digit number
+        discount_percentage = min(round(fake.random.randint(1, 15) * 5 / 100, 2), 0.8)  # Random discount percentage in 5% increments, divide by 100
+        start_days = rng.randrange(*last_year_days)
+        start_date = discount_dates[start_days + 30]  # Start date within the last year
+        end_date = discount_dates[start_days]  # End date is 1 month after the start date
+
+        # Assign product_id with some random duplication on the 20th to 30th products for discounts 50 to 100
+        if 50 <= discount_id_num <= 100:
+            product_id = products.sample(rng, min(19, len(products) - 1), min(30, len(products)))
+        else:
+            product_id = products.sample(rng)
+
+        yield (
+            discount_id,
+            discount_percentage,
+            start_date,
+            end_date,
+            product_id
+        )
+
+def discount(filename, num_discounts=500, keys=None):
+    # Generate and write discount data to the CSV file
+    write_table(filename, 'discount', discount_fieldnames, discount_rows, num_discounts, fake, random, keys)
 
-# Call the function to generate and save discount data to a CSV file
-discount('discount.csv', num_discounts=500)
 
 # %% order
 
@@ -395,108 +971,1752 @@ general_reviews = [
     "Overall, a positive experience with this product."
 ]
 
+order_fieldnames = ['order_number', 'payment_method', 'order_date', 'quantity', 'review', 'customer_id', 'product_id', 'shipment_id', 'customer_rating']
+
+# Function to generate order rows for the row range [start, stop)
+def order_rows(start, stop, fake, rng, keys=None):
+    keys = keys or default_keys()
+    customers, products = keys['customer'], keys['product']
+
+    # Initialize variables to keep track of the last order_number and payment_method
+    last_order_number = None
+    last_payment_method = None
+    last_product_id = None
+
+    order_number_format, shipment_id_format = id_format('order'), id_format('shipment')
+    order_dates = date_table(*last_year_days)
+
+    # Generate and write order data to the CSV file
+    for order_number_num in range(start, stop):
+        # Generate order_number and customer_id based on the pattern for the first 100 order rows
+        if order_number_num <= 100:
+            order_num = (order_number_num - 1) // 2 + 1
+            order_number = order_number_format % order_num
+            customer_id = customers.key((order_number_num - 1) // 2 % len(customers))
+
+            if order_number_num <= len(products):
+                # Use unique product IDs until every product has been ordered once
+                product_id = products.key(order_number_num - 1)
+            else:
+                # Once every product has been used, generate random product IDs
+                product_id = products.sample(rng)
+
+                # (order_number, product_id) is the key, so the second row of an order needs a different product
+                while order_number == last_order_number and product_id == last_product_id and len(products) > 1:
+                    product_id = products.sample(rng)
+        else:
+            order_num = order_number_num - 50 # Start from previous order number and so on
+            order_number = order_number_format % order_num
+            customer_id = customers.sample(rng)
+
+            # Generate random product IDs for orders after the first 50 orders
+            product_id = products.sample(rng)
+
+        last_product_id = product_id
+        quantity = fake.random_int(min=1, max=3)  # Random quantity between 1 and 3
+        review = rng.choice(general_reviews) if fake.boolean(chance_of_getting_true=60) else ''  # Add a review for 60% of the orders
+
+        # Order_date is the same as order_number
+        order_date = rng.choice(order_dates)
+
+        # Payment method takes reference from order_number for cash transactions
+        if last_order_number != order_number:
+            last_order_number = order_number
+            last_payment_method = fake.random_element(elements=('Credit Card', 'PayPal', 'Cash'))
+        
+        payment_method = last_payment_method
+
+        # Generate shipment_id_num based on order_number
+        shipment_id = shipment_id_format % order_num
+
+        # Generate customer_rating
+        customer_rating = rng.randint(1, 5)
+
+        yield (
+            order_number,
+            payment_method,
+            order_date,
+            quantity,
+            review,
+            customer_id,
+            product_id,
+            shipment_id,
+            customer_rating
+        )
+
 # Function to generate order data
-def generate_order_data(filename, num_orders=500):
-    fieldnames = ['order_number', 'payment_method', 'order_date', 'quantity', 'review', 'customer_id', 'product_id', 'shipment_id', 'customer_rating']
+# With a workload (see default_workload) customers, products, dates and basket sizes follow skewed distributions
+def generate_order_data(filename, num_orders=500, keys=None, workload=None, seed=None):
+    if workload is not None:
+        generate_workload_orders(filename, num_orders, workload, seed, keys=keys)
+        return
+
+    # Generate and write order data to the CSV file
+    write_table(filename, 'order', order_fieldnames, order_rows, num_orders, fake, random, keys)
+
 
-    with open(filename, 'w', newline='') as csvfile:
-        csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
+# %% shipment
+shipment_fieldnames = ['shipment_id', 'shipment_delay_days', 'shipment_cost', 'order_number', 'refund']
+
+# Function to generate the shipment row for one order
+def shipment_row(shipment_id, order_number, fake, rng):
+    shipment_delay_days = fake.random_int(min=1, max=3)  
+    shipment_cost = round(rng.uniform(1, 4), 1)
+    
+    # 5% chance of 'Yes', 95% chance of 'No'
+    refund = 'Yes' if fake.random_int(min=1, max=100) <= 5 else 'No'
+
+    return (
+        shipment_id,
+        shipment_delay_days,
+        shipment_cost,
+        order_number,
+        refund
+    )
+
+# Function to check that the shipments up to last_shipment_num each have an order of their own
+def check_shipment_count(last_shipment_num, orders):
+    if last_shipment_num > len(orders):
+        raise ValueError(f'{last_shipment_num} shipments for {len(orders)} orders, there is one shipment per order')
+
+# Function to count the shipments to generate when no count is given: one for every order
+# after the last_shipment_num orders that already have one
+def unshipped_orders(keys, last_shipment_num=0):
+    return max(len(keys['order']) - last_shipment_num, 0)
+
+# Function to generate shipment rows for the id range [start, stop)
+def shipment_rows(start, stop, fake, rng, keys=None):
+    orders = (keys or default_keys())['order']
+    shipment_id_format = id_format('shipment')
+
+    check_shipment_count(stop - 1, orders)
+
+    for shipment_id_num in range(start, stop):
+        shipment_id = shipment_id_format % shipment_id_num  # Format shipment_id as 'sh' followed by 5-digit number
+        
+        # Reference order_number from the existing order data, shipment n belonging to the n-th order
+        order_number = orders.key(shipment_id_num - 1)
+
+        yield shipment_row(shipment_id, order_number, fake, rng)
+
+# Positions of the order columns a shipment is derived from
+order_number_index = order_fieldnames.index('order_number')
+shipment_id_index = order_fieldnames.index('shipment_id')
+
+# Function to generate one shipment row per order, taken from a stream of order rows
+# Rows of the same order are adjacent, so only the last order number has to be remembered
+def shipments_from_orders(orders, fake, rng):
+    last_order_number = None
+    for order in orders:
+        if order[order_number_index] != last_order_number:
+            last_order_number = order[order_number_index]
+            yield shipment_row(order[shipment_id_index], last_order_number, fake, rng)
+
+def shipment(filename, num_shipments=450, keys=None):
+    # Generate and write shipment data to the CSV file
+    write_table(filename, 'shipment', shipment_fieldnames, shipment_rows, num_shipments, fake, random, keys)
+
+# Function to generate shipment data for the orders actually written to order_filename
+def shipment_from_orders(filename, order_filename):
+    with open(order_filename, 'r', newline='') as orderfile, open(filename, 'w', newline='') as csvfile:
+        csvwriter = csv.writer(csvfile)
+        
         # Write the header
-        csvwriter.writeheader()
-
-        # Initialize variables to keep track of the last order_number and payment_method
-        last_order_number = None
-        last_payment_method = None
-
-        # Generate unique product IDs for the first 50 orders
-        unique_product_ids = set(f'p{i:03}' for i in range(1, 52))
-
-        # Generate and write order data to the CSV file
-        for order_number_num in range(1, num_orders + 1):
-            # Generate order_number and customer_id based on the pattern for the first 100 order rows
-            if order_number_num <= 100:
-                order_number = f'on{(order_number_num - 1) // 2 + 1:05}'
-                customer_id = f'c{(order_number_num - 1) // 2 + 1:05}'
-
-                if unique_product_ids:
-                    # Use unique product IDs for the first 50 orders
-                    product_id = unique_product_ids.pop()
-                else:
-                    # If the set is empty, generate random product IDs
-                    product_id = f'p{random.randint(1, 51):03}'
+        csvwriter.writerow(shipment_fieldnames)
+
+        # Read the orders one row at a time, skipping their header, and write a shipment for each order number
+        orders = csv.reader(orderfile)
+        next(orders, None)
+        csvwriter.writerows(shipments_from_orders(orders, fake, random))
+
+
+# %% streaming pipeline
+
+# Typed, immutable row tuples in the column order of each table
+CustomerRow = namedtuple('CustomerRow', customer_fieldnames)
+SellerRow = namedtuple('SellerRow', seller_fieldnames)
+CategoryRow = namedtuple('CategoryRow', category_fieldnames)
+ProductRow = namedtuple('ProductRow', product_fieldnames)
+DiscountRow = namedtuple('DiscountRow', discount_fieldnames)
+OrderRow = namedtuple('OrderRow', order_fieldnames)
+ShipmentRow = namedtuple('ShipmentRow', shipment_fieldnames)
+
+# Every table with its row type and row generator
+stream_tables = {
+    'customer': (CustomerRow, customer_rows),
+    'seller': (SellerRow, seller_rows),
+    'category': (CategoryRow, category_rows),
+    'product': (ProductRow, product_rows),
+    'discount': (DiscountRow, discount_rows),
+    'order': (OrderRow, order_rows),
+    'shipment': (ShipmentRow, shipment_rows),
+}
+
+# Function to lazily yield num_rows typed rows of a table, starting at row number start
+def stream(table, num_rows, start=1, fake=fake, rng=random, keys=None):
+    row_type, rows = stream_tables[table]
+    for row in rows(start, start + num_rows, fake, rng, keys):
+        yield row_type._make(row)
+
+# Function to lazily yield ('order', OrderRow) and ('shipment', ShipmentRow) pairs,
+# deriving each order's shipment as soon as the order comes through
+def order_shipment_stream(num_orders, start=1, fake=fake, rng=random, keys=None):
+    last_order_number = None
+    for row in order_rows(start, start + num_orders, fake, rng, keys):
+        order = OrderRow._make(row)
+        yield 'order', order
+
+        if order.order_number != last_order_number:
+            last_order_number = order.order_number
+            yield 'shipment', ShipmentRow._make(shipment_row(order.shipment_id, order.order_number, fake, rng))
+
+# Function to write a stream of (table, row) pairs into one CSV file per table ({table: filename})
+def write_stream(filenames, rows):
+    csvfiles = {table: open(filename, 'w', newline='') for table, filename in filenames.items()}
+    try:
+        csvwriters = {table: csv.writer(csvfile) for table, csvfile in csvfiles.items()}
+        for table, csvwriter in csvwriters.items():
+            csvwriter.writerow(stream_tables[table][0]._fields)
+
+        num_rows = dict.fromkeys(filenames, 0)
+        for table, row in rows:
+            csvwriters[table].writerow(row)
+            num_rows[table] += 1
+    finally:
+        for csvfile in csvfiles.values():
+            csvfile.close()
+
+    return num_rows
+
+# Function to generate orders and their shipments in one pass, in constant memory
+def generate_orders_and_shipments(order_filename, shipment_filename, num_orders=500, keys=None):
+    return write_stream({'order': order_filename, 'shipment': shipment_filename}, order_shipment_stream(num_orders, keys=keys))
+
+
+
+# %% sharded generation
+
+# Tables that can be split by id range across a process pool
+sharded_tables = {
+    'customer': (customer_fieldnames, customer_rows),
+    'seller': (seller_fieldnames, seller_rows),
+    'order': (order_fieldnames, order_rows),
+}
+
+# One Faker per worker process, reseeded for every shard it generates
+worker_fake = None
+
+# Function to generate one shard of a table into its own part file
+# With a seed the rows are those of seeded_rows, the same however the table is split up; without one the shard is
+# seeded from (shard_seed, table, shard_index), so it does not depend on which worker runs it
+# formats are the parent's key_formats, which workers started with spawn do not inherit
+# With validation_keys ({parent: key index}) the rows are checked as they are written, numbered as in the whole table,
+# foreign keys against validation_keys, and the report is handed back
+def generate_shard(table, filename, start, stop, seed, shard_seed, shard_index, header, keys=None, pool_size=None, formats=None, validation_keys=None):
+    global worker_fake
+    fieldnames, rows = sharded_tables[table]
+    if formats:
+        key_formats.update(formats)
+
+    if seed is None:
+        rng = random.Random(f'{shard_seed}:{table}:{shard_index}')
+        if worker_fake is None:
+            worker_fake = new_faker()
+        worker_fake.seed_instance(rng.getrandbits(64))
+        shard_fake = worker_fake
+    else:
+        rows, shard_fake, rng = row_source(table, seed)
+
+    # Every worker memory-maps the same cached pools instead of warming up Faker's providers itself
+    if pool_size:
+        shard_fake = PoolFaker(load_pools(pool_size=pool_size), shard_fake)
+
+    shard_rows = rows(start, stop, shard_fake, rng, keys)
+    report = None
+    if validation_keys is not None:
+        report = ValidationReport()
+        validator = Validator(table, validation_keys, report)
+        validator.num_rows = start - 1
+        shard_rows = validated_rows(shard_rows, validator)
+
+    with open(filename, 'w', newline='') as csvfile:
+        csvwriter = csv.writer(csvfile)
+        if header:
+            csvwriter.writerow(fieldnames)
+        csvwriter.writerows(shard_rows)
+
+    return filename, report
+
+# Function to generate a table across a process pool, one shard per id range
+# With a seed the file holds the same rows as an unsharded seeded run (see seeded_rows), whatever the shard size
+# and number of workers; without one every shard is seeded from a base drawn once per call
+# The merged file is compressed for .gz and .zst names; with a report the rows are checked into it in the workers,
+# where each shard's ids are unique within the shard and the id ranges never overlap
+# Foreign keys are checked against validation_keys ({parent: key index}), not the keys the rows are drawn from
+def generate_sharded(table, filename, num_rows, seed=None, shard_size=100_000, workers=None, part_files=False, keys=None, pool_size=None, report=None, validation_keys=None):
+    # process pool for sharded generation, imported here to keep module import cheap
+    from concurrent.futures import ProcessPoolExecutor
+
+    fieldnames = sharded_tables[table][0]
+
+    # Build the pool cache once up front rather than in every worker
+    if pool_size:
+        load_pools(pool_size=pool_size)
+
+    # Keep the paired order rows (on00001 twice, on00002 twice, ...) inside the same shard
+    if table == 'order':
+        shard_size += shard_size % 2
+
+    shard_seed = random.getrandbits(64) if seed is None else None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(generate_shard, table, f'{filename}.part{shard_index:04}',
+                        start, min(start + shard_size, num_rows + 1), seed, shard_seed, shard_index, part_files, keys, pool_size,
+                        dict(key_formats), None if report is None else validation_keys or {})
+            for shard_index, start in enumerate(range(1, num_rows + 1, shard_size))
+        ]
+        part_names = []
+        for future in futures:
+            part_name, shard_report = future.result()
+            part_names.append(part_name)
+            if report is not None:
+                report.update(shard_report)
+
+    # Either leave one CSV per shard, or merge them in id order into a single file
+    if part_files:
+        return part_names
+
+    header = io.StringIO()
+    csv.writer(header).writerow(fieldnames)
+    with BlockWriter(filename) as blocks:
+        blocks.write(header.getvalue().encode())
+        for part_name in part_names:
+            with open(part_name, 'rb') as part:
+                while block := part.read(1 << 20):
+                    blocks.write(block)
+            os.remove(part_name)
+
+    return [filename]
+
+
+# %% batch column generation
+
+# Country names in the same order as country_codes, so a code index maps straight to its country
+country_names = [get_country_info_cust(country_code) for country_code in country_codes]
+
+# Function to format an integer id column as prefix followed by a zero-padded number
+# The digits are written straight into a fixed-width byte matrix; numbers too long for width fall back to zfill
+def format_ids(prefix, numbers, width):
+    numbers = np.asarray(numbers, dtype=np.int64)
+    if len(numbers) and numbers.max() >= 10 ** width:
+        return np.char.add(prefix, np.char.zfill(numbers.astype(str), width))
+
+    chars = np.empty((len(numbers), len(prefix) + width), dtype=np.uint8)
+    chars[:, :len(prefix)] = np.frombuffer(prefix.encode(), dtype=np.uint8)
+    chars[:, len(prefix):] = numbers[:, None] // 10 ** np.arange(width - 1, -1, -1, dtype=np.int64) % 10 + ord('0')
+    return chars.view(f'S{len(prefix) + width}').ravel().astype(str)
+
+# Function to format an array of a table's id numbers with the table's prefix and width
+def table_ids(table, numbers):
+    prefix, width = key_formats[table]
+    return format_ids(prefix, numbers, width)
+
+# Function to draw day offsets uniformly from the last year ('-1y'..'now'), as days before today
+def days_last_year(np_rng, size):
+    return np_rng.integers(*last_year_days, size=size)
+
+# Function to generate customer columns for the id range [start, stop)
+def customer_columns(start, stop, np_rng, pools, keys=None):
+    size = stop - start
+    genders = np.array(['Male', 'Female', 'Other'])[np_rng.integers(0, 3, size=size)]
+
+    # Male customers take a male first name, everyone else a female one (as in customer_rows)
+    pool_index = np_rng.integers(0, len(pools['first_name_male']), size=size)
+    first_names = np.where(genders == 'Male', pools['first_name_male'][pool_index], pools['first_name_female'][pool_index])
+    last_names = pools['last_name'][np_rng.integers(0, len(pools['last_name']), size=size)]
+    emails = np.char.add(np.char.add(np.char.add(np.char.lower(first_names), '_'), np.char.lower(last_names)), '@gmail.com')
+
+    country_index = np_rng.integers(0, len(country_codes), size=size)
+    phones = np.char.add(np.char.add(np.char.add('(', np.array(country_codes)[country_index]), ')'),
+                         np_rng.integers(10**9, 10**10, size=size).astype(str))
+
+    # Customers are aged between 35 and 60, dates written as dd/mm/yyyy
+    first_birth_day, stop_birth_day = birth_days()
+    dates_of_birth = format_dates(np_rng.integers(first_birth_day, stop_birth_day, size=size), first_birth_day, stop_birth_day, '%d/%m/%Y')
+
+    return {
+        'customer_id': table_ids('customer', np.arange(start, stop)).tolist(),
+        'first_name': first_names.tolist(),
+        'last_name': last_names.tolist(),
+        'gender': genders.tolist(),
+        'date_of_birth': dates_of_birth,
+        'email': emails.tolist(),
+        'phone': phones.tolist(),
+        'customer_street': pools['street_address'][np_rng.integers(0, len(pools['street_address']), size=size)].tolist(),
+        'customer_country': np.array(country_names)[country_index].tolist(),
+        'customer_zip_code': pools['zipcode'][np_rng.integers(0, len(pools['zipcode']), size=size)].tolist(),
+        'platform': np.array(['Facebook', 'Instagram', 'Referral', 'Others'])[np_rng.integers(0, 4, size=size)].tolist(),
+    }
+
+# Function to generate product columns for the id range [start, stop)
+def product_columns(start, stop, np_rng, pools, keys=None):
+    keys = keys or default_keys()
+    categories, sellers = keys['category'], keys['seller']
+    product_id_nums = np.arange(start, stop)
+    size = len(product_id_nums)
+    category_positions, product_names, product_descriptions = zip(*(catalogue_product(num, len(categories)) for num in range(start, stop))) if size else ((), (), ())
+
+    # The first 10 products go to the first 5 sellers in pairs, the rest to random sellers
+    seller_id_nums = np.where(product_id_nums <= 10, sellers.numbers_at((product_id_nums - 1) // 2 % len(sellers)), sellers.sample_numbers(np_rng, size))
+
+    return {
+        'product_id': table_ids('product', product_id_nums).tolist(),
+        'product_name': list(product_names),
+        'price': np.round(np_rng.uniform(1, 150, size=size), 1).tolist(),
+        'product_description': list(product_descriptions),
+        'inventory': np_rng.integers(1, 101, size=size).tolist(),
+        'weight': np.round(np_rng.uniform(1.00, 10.00, size=size), 2).tolist(),
+        'category_id': format_ids(categories.prefix, categories.numbers_at(np.array(category_positions, dtype=np.int64)), categories.width).tolist(),
+        'seller_id': format_ids(sellers.prefix, seller_id_nums, sellers.width).tolist(),
+        'product_views': np_rng.integers(500, 1001, size=size).tolist(),
+    }
+
+# Function to generate discount columns for the id range [start, stop)
+def discount_columns(start, stop, np_rng, pools, keys=None):
+    products = (keys or default_keys())['product']
+    discount_id_nums = np.arange(start, stop)
+    size = stop - start
+    start_days = days_last_year(np_rng, size)
+
+    # Discounts 50..100 duplicate the 20th to 30th products, the rest spread over every product
+    product_id_nums = np.where((discount_id_nums >= 50) & (discount_id_nums <= 100),
+                               products.sample_numbers(np_rng, size, min(19, len(products) - 1), min(30, len(products))),
+                               products.sample_numbers(np_rng, size))
+
+    return {
+        'discount_id': table_ids('discount', discount_id_nums).tolist(),
+        'discount_percentage': np.minimum(np_rng.integers(1, 16, size=size) * 5 / 100, 0.8).round(2).tolist(),
+        'discount_start_date': format_dates(start_days, *last_year_days),
+        'discount_end_date': format_dates(start_days - 30, last_year_days[0] - 30, last_year_days[1]),
+        'product_id': format_ids(products.prefix, product_id_nums, products.width).tolist(),
+    }
+
+# Function to generate order columns for the row range [start, stop)
+def order_columns(start, stop, np_rng, pools, keys=None):
+    keys = keys or default_keys()
+    customers, products = keys['customer'], keys['product']
+    order_row_nums = np.arange(start, stop)
+    size = stop - start
+
+    # The first 100 rows are 50 two-product orders for the first 50 customers
+    paired = order_row_nums <= 100
+    order_number_nums = np.where(paired, (order_row_nums - 1) // 2 + 1, order_row_nums - 50)
+    customer_id_nums = np.where(paired, customers.numbers_at((order_number_nums - 1) % len(customers)), customers.sample_numbers(np_rng, size))
+
+    # Every product is ordered once before products are drawn at random
+    product_positions = np.where(order_row_nums <= len(products), order_row_nums - 1, np_rng.integers(0, len(products), size=size))
+
+    # (order_number, product_id) is the key, so the second row of an order moves on to the next product
+    previous_product_positions = np.concatenate(([-1], product_positions[:-1]))
+    repeated = paired & (order_row_nums % 2 == 0) & (product_positions == previous_product_positions)
+    product_id_nums = products.numbers_at(np.where(repeated, (product_positions + 1) % len(products), product_positions))
+
+    # One payment method per order number, shared by every row of that order
+    payment_methods = np.array(['Credit Card', 'PayPal', 'Cash'])[np_rng.integers(0, 3, size=order_number_nums[-1] - order_number_nums[0] + 1)]
+    reviews = np.where(np_rng.random(size) < 0.6, np.array(general_reviews)[np_rng.integers(0, len(general_reviews), size=size)], '')
+
+    return {
+        'order_number': table_ids('order', order_number_nums).tolist(),
+        'payment_method': payment_methods[order_number_nums - order_number_nums[0]].tolist(),
+        'order_date': format_dates(days_last_year(np_rng, size), *last_year_days),
+        'quantity': np_rng.integers(1, 4, size=size).tolist(),
+        'review': reviews.tolist(),
+        'customer_id': format_ids(customers.prefix, customer_id_nums, customers.width).tolist(),
+        'product_id': format_ids(products.prefix, product_id_nums, products.width).tolist(),
+        'shipment_id': table_ids('shipment', order_number_nums).tolist(),
+        'customer_rating': np_rng.integers(1, 6, size=size).tolist(),
+    }
+
+# Function to generate shipment columns for the id range [start, stop)
+def shipment_columns(start, stop, np_rng, pools, keys=None):
+    orders = (keys or default_keys())['order']
+    check_shipment_count(stop - 1, orders)
+    shipment_id_nums = np.arange(start, stop)
+    size = stop - start
+
+    return {
+        'shipment_id': table_ids('shipment', shipment_id_nums).tolist(),
+        'shipment_delay_days': np_rng.integers(1, 4, size=size).tolist(),
+        'shipment_cost': np.round(np_rng.uniform(1, 4, size=size), 1).tolist(),
+        'order_number': format_ids(orders.prefix, orders.numbers_at(shipment_id_nums - 1), orders.width).tolist(),
+        'refund': np.where(np_rng.integers(1, 101, size=size) <= 5, 'Yes', 'No').tolist(),  # 5% chance of 'Yes'
+    }
+
+# Tables that can be generated a whole column at a time
+batched_tables = {
+    'customer': (customer_fieldnames, customer_columns),
+    'product': (product_fieldnames, product_columns),
+    'discount': (discount_fieldnames, discount_columns),
+    'order': (order_fieldnames, order_columns),
+    'shipment': (shipment_fieldnames, shipment_columns),
+}
+
+# Function to write batches of columns to a CSV file, instrumented under table when metrics is set
+def write_batches(filename, fieldnames, batches, table=None):
+    started = time.perf_counter()
+    buffer = io.StringIO()
+    csvwriter = csv.writer(buffer)
+    csvwriter.writerow(fieldnames)
+
+    with BlockWriter(filename) as blocks:
+        if metrics is not None and table is not None:
+            blocks = Timed(blocks, metrics, f'{table}.disk')
+            batches = timed_batches(batches, metrics, table)
+        for columns in batches:
+            csvwriter.writerows(zip(*(columns[name] for name in fieldnames)))
+            flush_block(blocks, buffer)
+        flush_block(blocks, buffer)
+
+    if metrics is not None and table is not None:
+        table_done(metrics, table, started)
+
+# Pool size of the batch engine when none is given
+batch_pool_size = 1000
+
+# Function to lazily yield a table's column batches of batch_size rows
+# Faker-backed text is drawn from the cached pools (see load_pools) instead of calling Faker per row;
+# the pools are the shared default ones, the seed only picks the values drawn from them
+def column_batches(table, num_rows, seed=None, batch_size=100_000, pool_size=None, keys=None):
+    fieldnames, columns = batched_tables[table]
+    np_rng = np.random.default_rng(seed)
+
+    pools = None
+    if table == 'customer':
+        pools = {provider: pool.array() for provider, pool in load_pools(pool_size=pool_size or batch_pool_size).items()}
+
+    for start in range(1, num_rows + 1, batch_size):
+        yield columns(start, min(start + batch_size, num_rows + 1), np_rng, pools, keys)
+
+# Function to generate a table in column batches of batch_size rows
+def generate_batched(table, filename, num_rows, seed=None, batch_size=100_000, pool_size=None, keys=None):
+    batches = column_batches(table, num_rows, seed, batch_size, pool_size, keys)
+    if validation is not None:
+        batches = map(Validator(table, validation_keys, validation).check, batches)
+    write_batches(filename, batched_tables[table][0], batches, table)
+
+
+# %% skewed workload
+
+# Skewed order workload for load testing hot keys, caches and indexes
+default_workload = {
+    # Zipf exponents of customer and product popularity, 0 for uniform
+    'customer_skew': 1.05,
+    'product_skew': 1.2,
+
+    # Relative order volume per month (January first), peaking for the holidays
+    'month_weights': [0.8, 0.75, 0.85, 0.9, 0.95, 0.9, 0.95, 1.0, 0.95, 1.0, 1.4, 1.7],
+
+    # Relative order volume per weekday (Monday first); order_date has no time of day, so this stands in for a daily curve
+    'weekday_weights': [1.0, 0.95, 0.95, 1.0, 1.1, 1.3, 1.2],
+
+    # Probability of an order holding 1, 2, 3, ... different products
+    'basket_sizes': [0.55, 0.25, 0.12, 0.05, 0.03],
+}
+
+# Draws indexes 0..n-1 with probability proportional to weights, by inverse CDF
+# Building it is one cumulative sum; each draw is a binary search done for a whole array at once
+class CdfSampler:
+    def __init__(self, weights):
+        self.cdf = np.cumsum(np.asarray(weights, dtype=np.float64))
+        self.cdf /= self.cdf[-1]
+
+    def sample(self, np_rng, size):
+        return np.minimum(np.searchsorted(self.cdf, np_rng.random(size), side='right'), len(self.cdf) - 1)
+
+# Function to build a Zipf sampler over n keys, the lowest positions being the most popular
+def zipf_sampler(n, skew):
+    return CdfSampler(1.0 / np.arange(1, n + 1, dtype=np.float64) ** skew)
+
+# Function to build the order date window ('-1y'..'now') and a sampler weighting each day by month and weekday
+def order_date_sampler(workload):
+    dates = np.datetime64('today', 'D') - np.arange(*last_year_days)
+    months = dates.astype('datetime64[M]').astype(np.int64) % 12
+    weekdays = (dates.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+    weights = np.asarray(workload['month_weights'])[months] * np.asarray(workload['weekday_weights'])[weekdays]
+    return dates, CdfSampler(weights)
+
+# Function to lazily yield order column batches following a skewed workload
+# Rows of an order share its customer, date and payment method; its products are all different
+def workload_order_batches(num_rows, workload=None, seed=None, batch_size=100_000, keys=None):
+    workload = {**default_workload, **(workload or {})}
+    keys = keys or default_keys()
+    customers, products = keys['customer'], keys['product']
+    np_rng = np.random.default_rng(seed)
+
+    customer_sampler = zipf_sampler(len(customers), workload['customer_skew'])
+    product_sampler = zipf_sampler(len(products), workload['product_skew'])
+    _, date_sampler = order_date_sampler(workload)
+    basket_sampler = CdfSampler(workload['basket_sizes'][:len(products)])
+
+    next_order_num = 1
+    for start in range(0, num_rows, batch_size):
+        size = min(batch_size, num_rows - start)
+
+        # Draw enough baskets to cover the batch; the last one is cut short at the end of the batch
+        basket_sizes = basket_sampler.sample(np_rng, size) + 1
+        basket_sizes = basket_sizes[:np.searchsorted(np.cumsum(basket_sizes), size) + 1]
+        num_orders = len(basket_sizes)
+        order_index = np.repeat(np.arange(num_orders), basket_sizes)[:size]
+
+        # Redraw any product that repeats within its order, since (order_number, product_id) is the key
+        product_positions = product_sampler.sample(np_rng, size)
+        while True:
+            order_products = order_index * len(products) + product_positions
+            sort_order = np.argsort(order_products, kind='stable')
+            repeated = np.zeros(size, dtype=bool)
+            repeated[sort_order[1:]] = order_products[sort_order[1:]] == order_products[sort_order[:-1]]
+            if not repeated.any():
+                break
+            product_positions[repeated] = product_sampler.sample(np_rng, int(repeated.sum()))
+
+        order_number_nums = next_order_num + order_index
+        customer_id_nums = customers.numbers_at(customer_sampler.sample(np_rng, num_orders))[order_index]
+        order_days = date_sampler.sample(np_rng, num_orders)[order_index]
+        payment_methods = np.array(['Credit Card', 'PayPal', 'Cash'])[np_rng.integers(0, 3, size=num_orders)][order_index]
+        reviews = np.where(np_rng.random(size) < 0.6, np.array(general_reviews)[np_rng.integers(0, len(general_reviews), size=size)], '')
+
+        yield {
+            'order_number': table_ids('order', order_number_nums).tolist(),
+            'payment_method': payment_methods.tolist(),
+            'order_date': format_dates(order_days, *last_year_days),
+            'quantity': np_rng.integers(1, 4, size=size).tolist(),
+            'review': reviews.tolist(),
+            'customer_id': format_ids(customers.prefix, customer_id_nums, customers.width).tolist(),
+            'product_id': format_ids(products.prefix, products.numbers_at(product_positions), products.width).tolist(),
+            'shipment_id': table_ids('shipment', order_number_nums).tolist(),
+            'customer_rating': np_rng.integers(1, 6, size=size).tolist(),
+        }
+
+        next_order_num += num_orders
+
+# Function to generate num_rows order rows following a skewed workload into a CSV file
+def generate_workload_orders(filename, num_rows, workload=None, seed=None, batch_size=100_000, keys=None):
+    batches = workload_order_batches(num_rows, workload, seed, batch_size, keys)
+    if validation is not None:
+        batches = map(Validator('order', validation_keys, validation).check, batches)
+    write_batches(filename, order_fieldnames, batches, 'order')
+
+
+# %% database sink
+
+# Every table with its Ecommerce.db table name, columns and row generator, parents before children
+db_tables = {
+    'customer': ('Customer', customer_fieldnames, customer_rows),
+    'seller': ('Sellers', seller_fieldnames, seller_rows),
+    'category': ('Category', category_fieldnames, category_rows),
+    'product': ('Product', product_fieldnames, product_rows),
+    'discount': ('Discount', discount_fieldnames, discount_rows),
+    'order': ('Order', order_fieldnames, order_rows),
+    'shipment': ('Shipment', shipment_fieldnames, shipment_rows),
+}
+
+# Indexes that are dropped for a full load and rebuilt once all the rows are in
+db_indexes = {
+    'idx_customer_customer_id': 'CREATE INDEX IF NOT EXISTS idx_customer_customer_id ON Customer (customer_id)',
+    'idx_sellers_seller_id': 'CREATE INDEX IF NOT EXISTS idx_sellers_seller_id ON Sellers (seller_id)',
+    'idx_order_customer_id': 'CREATE INDEX IF NOT EXISTS idx_order_customer_id ON "Order" (customer_id)',
+    'idx_order_product_id': 'CREATE INDEX IF NOT EXISTS idx_order_product_id ON "Order" (product_id)',
+    'idx_discount_product_id': 'CREATE INDEX IF NOT EXISTS idx_discount_product_id ON Discount (product_id)',
+    'idx_shipment_order_number': 'CREATE INDEX IF NOT EXISTS idx_shipment_order_number ON Shipment (order_number)',
+}
+
+# Function to insert a stream of row tuples into a table with batched executemany
+def insert_rows(connection, table, rows, batch_size=10_000):
+    db_table, fieldnames, _ = db_tables[table]
+    statement = f'INSERT INTO "{db_table}" ({", ".join(fieldnames)}) VALUES ({", ".join("?" for _ in fieldnames)})'
+
+    num_rows = 0
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        connection.executemany(statement, batch)
+        num_rows += len(batch)
+
+    return num_rows
+
+# Function to generate tables ({table: num_rows}) straight into the database, skipping the CSV files
+# With replace=False the rows are a delta appended after each table's highest id
+# The whole load is one transaction, so a failure leaves the database as it was
+# With validate=True the rows are checked as they are inserted, and the load is rolled back if any fail
+# With a seed every row is drawn from (seed, table, row number) alone, see seeded_rows
+def load_database(database='Ecommerce.db', tables=None, replace=True, batch_size=10_000, validate=False, seed=None):
+    tables = default_config['tables'] if tables is None else tables
+    connection = sqlite3.connect(database, isolation_level=None)
+
+    try:
+        # Fast settings for the load only
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=OFF')
+        connection.execute('BEGIN')
+
+        # A full replace drops the indexes and rebuilds them once all the rows are in,
+        # a delta keeps them, so appending costs the new rows only
+        if replace:
+            for name in db_indexes:
+                connection.execute(f'DROP INDEX IF EXISTS {name}')
+
+        # Foreign keys are drawn from the ids of the parent rows already in the database, or from the defaults for empty tables
+        keys = default_keys()
+        for table in db_tables:
+            if not (replace and table in tables) and (index := database_key_index(connection, table)):
+                keys[table] = index
+
+        report = ValidationReport() if validate else None
+        num_rows = {}
+        for table, (db_table, fieldnames, _) in db_tables.items():
+            if table not in tables:
+                continue
+
+            # Either start the table over, or append after its highest id
+            if replace:
+                connection.execute(f'DELETE FROM "{db_table}"')
+                start = 1
             else:
-                order_number = f'on{order_number_num - 50:05}' # Start from previous order number and so on
-                customer_id = f'c{random.randint(1, 500):05}'
+                start = next_row_num(table, last_id_in_database(connection, table))
 
-                # Generate random product IDs for orders after the first 50 orders
-                product_id = f'p{random.randint(1, 51):03}'
+            # Without a shipment count the orders that have no shipment yet get one each
+            num_new_rows = tables[table]
+            if num_new_rows is None:
+                num_new_rows = unshipped_orders(keys, start - 1)
+
+            rows, table_fake, table_rng = row_source(table, seed)
+            if metrics is None:
+                table_rows = rows(start, start + num_new_rows, table_fake, table_rng, keys)
+            else:
+                table_rows = timed_rows(rows(start, start + num_new_rows, Timed(table_fake, metrics, f'{table}.faker'), Timed(table_rng, metrics, f'{table}.random'), keys), metrics, table)
+            if report is not None:
+                # Foreign keys are checked against the parent ids in the database, including the rows loaded so far
+                parent_keys = {parent: database_key_index(connection, parent) for parent in foreign_keys.get(table, {}).values()}
+                table_rows = validated_rows(table_rows, Validator(table, parent_keys, report), batch_size)
+            num_rows[table] = insert_rows(connection, table, table_rows, batch_size)
+            if metrics is not None:
+                metrics.emit(event='done', table=table, rows=num_rows[table], seconds=metrics.timings.get(f'{table}.rows', 0.0), breakdown=metrics.breakdown(table))
+            # A replaced table holds the ids 1..n, an appended one keeps whatever ids it had before
+            keys[table] = key_index(table, last_id_in_database(connection, table)) if replace else database_key_index(connection, table)
+
+        if report:
+            raise ValueError(f'rows failed validation, nothing was loaded into {database}\n{report.summary()}')
+
+        # Rebuilds the dropped indexes, and creates any the database does not have yet
+        for statement in db_indexes.values():
+            connection.execute(statement)
+
+        # Replaced tables invalidate the summaries, appended rows are folded into them
+        update_summaries(connection, rebuild=replace)
+
+        connection.execute('COMMIT')
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+        raise
+    finally:
+        # Fold the write-ahead log back in so Ecommerce.db stays a single file
+        connection.execute('PRAGMA journal_mode=DELETE')
+        connection.close()
+
+    return num_rows
+
+
+# %% summary tables
+
+# Summary tables kept up to date by every load, so reports read a few hundred rows instead of joining the tables
+# SummaryState holds the highest rowid of each source table already counted in the summaries
+summary_tables = {
+    'SummaryState': '''CREATE TABLE IF NOT EXISTS SummaryState (
+        source_table TEXT PRIMARY KEY,
+        last_rowid INTEGER NOT NULL)''',
+    'CategorySalesSummary': '''CREATE TABLE IF NOT EXISTS CategorySalesSummary (
+        category_id TEXT NOT NULL,
+        month TEXT NOT NULL,
+        order_lines INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        revenue REAL NOT NULL,
+        PRIMARY KEY (category_id, month))''',
+    'ProductRatingSummary': '''CREATE TABLE IF NOT EXISTS ProductRatingSummary (
+        product_id TEXT PRIMARY KEY,
+        ratings INTEGER NOT NULL,
+        rating_total INTEGER NOT NULL,
+        average_rating REAL GENERATED ALWAYS AS (1.0 * rating_total / ratings))''',
+    'SellerCountrySummary': '''CREATE TABLE IF NOT EXISTS SellerCountrySummary (
+        seller_country TEXT PRIMARY KEY,
+        shipped_lines INTEGER NOT NULL,
+        refunded_lines INTEGER NOT NULL,
+        delayed_lines INTEGER NOT NULL,
+        delay_days INTEGER NOT NULL,
+        refund_rate REAL GENERATED ALWAYS AS (1.0 * refunded_lines / shipped_lines),
+        delay_rate REAL GENERATED ALWAYS AS (1.0 * delayed_lines / shipped_lines))''',
+    'ProductDiscountSummary': '''CREATE TABLE IF NOT EXISTS ProductDiscountSummary (
+        product_id TEXT PRIMARY KEY,
+        discounts INTEGER NOT NULL,
+        best_percentage REAL NOT NULL,
+        active_discounts INTEGER NOT NULL DEFAULT 0,
+        active_as_of TEXT)''',
+}
+
+# Shipments taking more than this many days count as delayed
+delayed_after_days = 1
+
+# Function to build the SQL that turns a date column into a 'YYYY-MM' month
+# The Python loads store dates as text, the R loads as days since 1970
+def sql_month(column):
+    return f"CASE typeof({column}) WHEN 'text' THEN substr({column}, 1, 7) ELSE strftime('%Y-%m', {column} * 86400, 'unixepoch') END"
+
+# Statements folding the source rows after :last_rowid into each summary, keyed by their source table
+summary_updates = {
+    'Order': [
+        f'''INSERT INTO CategorySalesSummary (category_id, month, order_lines, quantity, revenue)
+        SELECT P.category_id, {sql_month('O.order_date')}, COUNT(*), SUM(O.quantity), SUM(O.quantity * P.price)
+        FROM "Order" AS O JOIN Product AS P ON P.product_id = O.product_id
+        WHERE O.rowid > :last_rowid
+        GROUP BY 1, 2
+        ON CONFLICT (category_id, month) DO UPDATE SET
+            order_lines = order_lines + excluded.order_lines,
+            quantity = quantity + excluded.quantity,
+            revenue = revenue + excluded.revenue''',
+        '''INSERT INTO ProductRatingSummary (product_id, ratings, rating_total)
+        SELECT product_id, COUNT(*), SUM(customer_rating)
+        FROM "Order"
+        WHERE rowid > :last_rowid
+        GROUP BY product_id
+        ON CONFLICT (product_id) DO UPDATE SET
+            ratings = ratings + excluded.ratings,
+            rating_total = rating_total + excluded.rating_total''',
+    ],
+    # Every order line of a shipment counts once for the country of the line's seller
+    'Shipment': [
+        f'''INSERT INTO SellerCountrySummary (seller_country, shipped_lines, refunded_lines, delayed_lines, delay_days)
+        SELECT Se.seller_country, COUNT(*), SUM(S.refund = 'Yes'), SUM(S.shipment_delay_days > {delayed_after_days}), SUM(S.shipment_delay_days)
+        FROM Shipment AS S
+        JOIN "Order" AS O ON O.order_number = S.order_number
+        JOIN Product AS P ON P.product_id = O.product_id
+        JOIN Sellers AS Se ON Se.seller_id = P.seller_id
+        WHERE S.rowid > :last_rowid
+        GROUP BY Se.seller_country
+        ON CONFLICT (seller_country) DO UPDATE SET
+            shipped_lines = shipped_lines + excluded.shipped_lines,
+            refunded_lines = refunded_lines + excluded.refunded_lines,
+            delayed_lines = delayed_lines + excluded.delayed_lines,
+            delay_days = delay_days + excluded.delay_days''',
+    ],
+    'Discount': [
+        '''INSERT INTO ProductDiscountSummary (product_id, discounts, best_percentage)
+        SELECT product_id, COUNT(*), MAX(discount_percentage)
+        FROM Discount
+        WHERE rowid > :last_rowid
+        GROUP BY product_id
+        ON CONFLICT (product_id) DO UPDATE SET
+            discounts = discounts + excluded.discounts,
+            best_percentage = MAX(best_percentage, excluded.best_percentage)''',
+    ],
+}
 
-            quantity = fake.random_int(min=1, max=3)  # Random quantity between 1 and 3
-            review = random.choice(general_reviews) if fake.boolean(chance_of_getting_true=60) else ''  # Add a review for 60% of the orders
+# Whether a discount runs on the day :today (text dates) or :today_days (days since 1970)
+active_discount = '''CASE typeof(D.discount_start_date)
+    WHEN 'text' THEN :today BETWEEN D.discount_start_date AND D.discount_end_date
+    ELSE :today_days BETWEEN D.discount_start_date AND D.discount_end_date END'''
+
+# Function to bring the summary tables up to date with the rows added since the last update
+# With rebuild=True (after tables were replaced) they are recounted from scratch instead
+# Rows added outside load_database, such as by the R loads, are picked up on the next update
+def update_summaries(connection, rebuild=False, as_of=None):
+    for statement in summary_tables.values():
+        connection.execute(statement)
+    if rebuild:
+        for summary_table in summary_tables:
+            connection.execute(f'DELETE FROM {summary_table}')
+
+    for source_table, statements in summary_updates.items():
+        row = connection.execute('SELECT last_rowid FROM SummaryState WHERE source_table = ?', (source_table,)).fetchone()
+        last_rowid = row[0] if row else 0
+        new_last_rowid = connection.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{source_table}"').fetchone()[0]
+        if new_last_rowid <= last_rowid:
+            continue
+        for statement in statements:
+            connection.execute(statement, {'last_rowid': last_rowid})
+        connection.execute('INSERT OR REPLACE INTO SummaryState (source_table, last_rowid) VALUES (?, ?)', (source_table, new_last_rowid))
+
+    # Discounts start and end with time, so the active counts are recounted for each day's date
+    # Discount is the smallest fact table and is read through its product_id index
+    as_of = as_of or datetime.now().date()
+    connection.execute(f'''UPDATE ProductDiscountSummary SET
+        active_discounts = (SELECT COUNT(*) FROM Discount AS D WHERE D.product_id = ProductDiscountSummary.product_id AND {active_discount}),
+        active_as_of = :today''', {'today': as_of.isoformat(), 'today_days': (as_of - datetime(1970, 1, 1).date()).days})
+
+# Function to update the summary tables of a database outside of a load
+def refresh_summaries(database='Ecommerce.db', rebuild=False):
+    connection = sqlite3.connect(database, isolation_level=None)
+    try:
+        connection.execute('BEGIN')
+        update_summaries(connection, rebuild)
+        connection.execute('COMMIT')
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+        raise
+    finally:
+        connection.close()
+
+
+# %% validation
+
+# Report the generators check their rows into; None (the default) turns validation off
+validation = None
+
+# Parent key indexes the generated rows' foreign keys are checked against, read from where the parents were written
+# rather than the keys the rows were drawn from; parents missing here are reported as not checked
+validation_keys = {}
+
+# Allowed values of the enum columns
+column_domains = {
+    'customer': {'gender': {'Male', 'Female', 'Other'}, 'platform': {'Facebook', 'Instagram', 'Referral', 'Others'}},
+    'order': {'payment_method': {'Credit Card', 'PayPal', 'Cash'}},
+    'shipment': {'refund': {'Yes', 'No'}},
+}
 
-            # Order_date is the same as order_number
-            order_date = fake.date_between(start_date='-1y', end_date='now').strftime('%Y-%m-%d')
+# Regular expressions the whole value of a column has to match, as in the R loader's checks
+phone_format = r'\(\+\d+\)\d{10}'
+zip_code_format = r'\d{4}|\d{5}|\d{6}|\d{5}-\d{4}|[A-Z]{2}\d{1,2}[A-Z]? \d[A-Z]{2}'
+decimal_format = r'\d+(\.\d+)?'
+count_format = r'\d+'
+column_formats = {
+    'customer': {'email': r'\S+@\S+\.\S+', 'phone': phone_format, 'customer_zip_code': zip_code_format},
+    'seller': {'supplier_email': r'\S+@\S+\.\S+', 'supplier_phone': phone_format, 'seller_zip_code': zip_code_format},
+    'product': {'price': decimal_format, 'weight': decimal_format, 'inventory': count_format, 'product_views': count_format},
+    'discount': {'discount_percentage': decimal_format},
+    'order': {'quantity': r'[1-9]\d*', 'customer_rating': r'[1-5]'},
+    'shipment': {'shipment_delay_days': count_format, 'shipment_cost': decimal_format},
+}
 
-            # Payment method takes reference from order_number for cash transactions
-            if last_order_number != order_number:
-                last_order_number = order_number
-                last_payment_method = fake.random_element(elements=('Credit Card', 'PayPal', 'Cash'))
-            
-            payment_method = last_payment_method
+# Format of every date column
+column_dates = {
+    'customer': {'date_of_birth': '%d/%m/%Y'},
+    'discount': {'discount_start_date': '%Y-%m-%d', 'discount_end_date': '%Y-%m-%d'},
+    'order': {'order_date': '%Y-%m-%d'},
+}
 
-            # Generate shipment_id_num based on order_number
-            shipment_id = f'sh{order_number[2:]}'
+# Parent table of every foreign key column
+# Order.shipment_id is left out, as shipments are generated after their orders
+foreign_keys = {
+    'product': {'category_id': 'category', 'seller_id': 'seller'},
+    'discount': {'product_id': 'product'},
+    'order': {'customer_id': 'customer', 'product_id': 'product'},
+    'shipment': {'order_number': 'order'},
+}
 
-            # Generate customer_rating
-            customer_rating = random.randint(1, 5)
+# Columns identifying a row, for the tables where the id in the first column does not
+primary_keys = {'order': ('order_number', 'product_id')}
+
+# Other columns whose values are unique: every order has one shipment
+unique_columns = {'shipment': ('order_number',)}
+
+# Failing rows counted per (table, column, check), keeping the first few as examples
+class ValidationReport:
+    def __init__(self, examples=3):
+        self.examples = examples
+        self.errors = {}
+        self.skipped = []
+
+    # Number of failures
+    def __len__(self):
+        return sum(count for count, _ in self.errors.values())
+
+    # Record failing rows (numbered from 1, not counting the header) with their values
+    def add(self, table, column, check, rows, values):
+        entry = self.errors.setdefault((table, column, check), [0, []])
+        entry[0] += len(rows)
+        entry[1].extend(list(zip(rows, values))[:self.examples - len(entry[1])])
+
+    # Fold in the failures and skipped checks of another report, e.g. one handed back by a worker process
+    def update(self, other):
+        for (table, column, check), (count, examples) in other.errors.items():
+            entry = self.errors.setdefault((table, column, check), [0, []])
+            entry[0] += count
+            entry[1].extend(examples[:self.examples - len(entry[1])])
+        for what, reason in other.skipped:
+            self.skip(what, reason)
+
+    # Record a check that could not be run, e.g. ('order.customer_id foreign key', 'no customer ids to check against')
+    def skip(self, what, reason):
+        if (what, reason) not in self.skipped:
+            self.skipped.append((what, reason))
+
+    # One line per failing check, e.g. "order.customer_id foreign key: 2 rows, e.g. row 5 'c99999', row 9 'c99998'",
+    # then one per check that was not run; empty when every check ran and passed
+    def summary(self):
+        lines = []
+        for (table, column, check), (count, examples) in self.errors.items():
+            shown = ', '.join(f'row {row} {value!r}' for row, value in examples)
+            lines.append(f'{table}.{column} {check}: {count} rows, e.g. {shown}')
+        lines.extend(f'{what}: not checked, {reason}' for what, reason in self.skipped)
+        return '\n'.join(lines)
+
+# Checks a table's rows one batch of columns at a time: unique keys, enum domains, formats, dates and foreign keys
+# Every check runs over a column's distinct values with set operations, so a column of dates or enums costs one set()
+# per batch; rows are only gone through one by one to report the ones that failed
+# Foreign keys are checked against keys ({table: KeyIndex or set of ids}); tables missing from keys are reported as skipped
+class Validator:
+    def __init__(self, table, keys=None, report=None):
+        self.table = table
+        self.fieldnames = db_tables[table][1]
+        self.keys = default_keys() if keys is None else keys
+        self.report = ValidationReport() if report is None else report
+        self.num_rows = 0
+
+        # Ids seen so far, which child tables can check their foreign keys against, and the row keys when those differ
+        self.ids = set()
+        self.row_keys = set() if table in primary_keys else self.ids
+        self.unique_values = {column: set() for column in unique_columns.get(table, ())}
+
+        self.formats = {self.fieldnames[0]: re.compile(re.escape(key_formats[table][0]) + r'\d+')}
+        self.formats.update((column, re.compile(pattern)) for column, pattern in column_formats.get(table, {}).items())
+
+    # Check a batch of columns ({column: values}) and hand it back, so check can be mapped over a stream of batches
+    def check(self, columns):
+        first_row = self.num_rows + 1
+        ids = columns[self.fieldnames[0]]
+        self.num_rows += len(ids)
+
+        if self.table in primary_keys:
+            self.ids.update(ids)
+            self.check_unique('+'.join(primary_keys[self.table]), list(zip(*(columns[column] for column in primary_keys[self.table]))), first_row, self.row_keys)
+        else:
+            self.check_unique(self.fieldnames[0], ids, first_row, self.row_keys)
+        for column, seen in self.unique_values.items():
+            self.check_unique(column, columns[column], first_row, seen)
+
+        for column, domain in column_domains.get(self.table, {}).items():
+            self.check_values(column, 'domain', columns[column], first_row, lambda values: values - domain)
+        for column, pattern in self.formats.items():
+            self.check_values(column, 'format', columns[column], first_row, lambda values: {value for value in values if not pattern.fullmatch(str(value))})
+        for column, date_format in column_dates.get(self.table, {}).items():
+            self.check_values(column, 'date', columns[column], first_row, lambda values: {value for value in values if not valid_date(value, date_format)})
+        for column, parent in foreign_keys.get(self.table, {}).items():
+            if parent not in self.keys:
+                self.report.skip(f'{self.table}.{column} foreign key', f'no {parent} ids to check against')
+                continue
+            parent_keys = self.keys[parent]
+            self.check_values(column, 'foreign key', columns[column], first_row, lambda values: {value for value in values if not (isinstance(value, str) and value in parent_keys)})
+
+        return columns
+
+    # Check a batch of row tuples in fieldname order and hand it back
+    def check_rows(self, rows):
+        if rows:
+            self.check(dict(zip(self.fieldnames, zip(*rows))))
+        return rows
+
+    # Report the rows of values whose value is in the set find_bad returns for the distinct values
+    def check_values(self, column, check, values, first_row, find_bad):
+        bad = find_bad(set(values))
+        if bad:
+            rows = [row for row, value in enumerate(values, first_row) if value in bad]
+            self.report.add(self.table, column, check, rows, [values[row - first_row] for row in rows])
+
+    # Report the rows repeating a value of this batch or of an earlier one, adding the batch's values to seen
+    def check_unique(self, column, values, first_row, seen):
+        batch = set(values)
+        repeated = batch & seen
+        seen.update(batch)
+        if len(batch) == len(values) and not repeated:
+            return
+
+        rows = []
+        batch_seen = set()
+        for row, value in enumerate(values, first_row):
+            if value in repeated or value in batch_seen:
+                rows.append(row)
+            batch_seen.add(value)
+        self.report.add(self.table, column, 'unique', rows, [values[row - first_row] for row in rows])
+
+# Function to tell whether a value is a date in date_format
+def valid_date(value, date_format):
+    try:
+        datetime.strptime(value, date_format)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+# Function to check a stream of row tuples in batches of batch_size rows as it passes through
+def validated_rows(rows, validator, batch_size=10_000):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        yield from validator.check_rows(batch)
+
+# Function to check a table's CSV file (compressed for .gz and .zst names) in batches of batch_size rows
+def validate_file(filename, table, keys=None, report=None, batch_size=100_000):
+    validator = Validator(table, keys, report)
+    with open_input(filename) as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, [])
+        if missing := [column for column in validator.fieldnames if column not in header]:
+            validator.report.add(table, ', '.join(missing), 'missing column', [0], [header])
+            return validator
+        # Rows as tuples, which the garbage collector stops tracking, rather than the lists csv.reader yields
+        for columns in row_batches(map(tuple, reader), header, batch_size):
+            validator.check(columns)
+    return validator
+
+# Function to read the ids in the first column of a CSV file (compressed for .gz and .zst names) or a Parquet file
+def file_ids(filename):
+    if filename.endswith('.parquet'):
+        parquet_file = pq.ParquetFile(filename)
+        return set(parquet_file.read(columns=[parquet_file.schema_arrow.names[0]]).column(0).to_pylist())
+
+    with open_input(filename) as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)
+        return {row[0] for row in reader if row}
+
+# Function to check the CSV files of tables in output_dir, parents first,
+# so foreign keys are checked against the ids actually in the parent files
+# The ids of parent tables that are not checked themselves are still read from their files
+def validate_files(output_dir, tables=None, batch_size=100_000):
+    report = ValidationReport()
+    checked = [table for table in table_generators if tables is None or table in tables]
+    parents = {parent for table in checked for parent in foreign_keys.get(table, {}).values()}
+
+    keys = {}
+    for table, (_, filename) in table_generators.items():
+        if table not in checked and table not in parents:
+            continue
+
+        filenames = [os.path.join(output_dir, filename + suffix) for suffix in ('', *compression_suffixes.values())]
+        existing = [filename for filename in filenames if os.path.exists(filename)]
+        if table not in checked:
+            # A parent's ids can come from a Parquet file too
+            if parent_file := table_file(output_dir, table):
+                keys[table] = file_ids(parent_file)
+        elif not existing:
+            report.skip(table, f'no {filename} in {output_dir}')
+        else:
+            keys[table] = validate_file(existing[0], table, keys, report, batch_size).ids
+
+    return report
+
+
+# %% incremental delta
+
+# Function to find the row number that follows the row holding id number last_id_num
+def next_row_num(table, last_id_num):
+    # Order rows 1..100 hold orders on00001..on00050 in pairs, after that row n holds order n - 50
+    if table == 'order':
+        return last_id_num * 2 + 1 if last_id_num < 50 else last_id_num + 51
+    return last_id_num + 1
+
+# Function to turn an id such as 'c00042' into its number (0 when there is no id yet)
+def id_num(table, row_id):
+    return int(row_id[len(key_formats[table][0]):]) if row_id else 0
+
+# Function to read the highest id number of a CSV file from its last line only,
+# so resuming costs the same however large the file has grown
+def last_id_in_csv(filename, table):
+    if not os.path.exists(filename):
+        return 0
+
+    if filename.endswith(('.gz', '.zst')):
+        # Compressed files cannot be read from the end, so they are read through keeping only the last line
+        with open_input(filename) as csvfile:
+            lines = [line.encode() for line in deque(csvfile, maxlen=1)]
+    else:
+        with open(filename, 'rb') as csvfile:
+            csvfile.seek(0, os.SEEK_END)
+            csvfile.seek(max(csvfile.tell() - 64 * 1024, 0))
+            lines = csvfile.read().splitlines()
+
+    last_id = lines[-1].split(b',', 1)[0].decode() if lines else ''
+    return 0 if last_id == db_tables[table][1][0] else id_num(table, last_id)
+
+# Function to read the highest id number of a CSV or Parquet file from its last row
+def last_id_in_file(filename, table):
+    if not filename.endswith('.parquet'):
+        return last_id_in_csv(filename, table)
+
+    parquet_file = pq.ParquetFile(filename)
+    if parquet_file.num_row_groups == 0:
+        return 0
+    ids = parquet_file.read_row_group(parquet_file.num_row_groups - 1, columns=[db_tables[table][1][0]]).column(0)
+    return id_num(table, ids[-1].as_py() if len(ids) else None)
+
+# Function to read the highest id number of a database table from its last inserted row
+def last_id_in_database(connection, table):
+    db_table, fieldnames, _ = db_tables[table]
+    row = connection.execute(f'SELECT {fieldnames[0]} FROM "{db_table}" ORDER BY rowid DESC LIMIT 1').fetchone()
+    return id_num(table, row[0] if row else None)
+
+# Function to build the key index of the ids a database table holds (empty for an empty table)
+def database_key_index(connection, table):
+    db_table, fieldnames, _ = db_tables[table]
+    return ids_key_index(table, (row_id for row_id, in connection.execute(f'SELECT {fieldnames[0]} FROM "{db_table}"')))
+
+# Function to find a table's file in output_dir, as plain CSV, compressed CSV or Parquet (None when there is none)
+def table_file(output_dir, table):
+    filename = os.path.join(output_dir, table_generators[table][1])
+    for candidate in (filename, *(filename + suffix for suffix in compression_suffixes.values()), filename.replace('.csv', '.parquet')):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+# Function to build the key indexes of tables (every table by default) from the ids in their files in output_dir,
+# leaving out the tables without a file or with an empty one
+def file_keys(output_dir, tables=None):
+    keys = {}
+    for table in table_generators if tables is None else tables:
+        if (filename := table_file(output_dir, table)) and (index := ids_key_index(table, file_ids(filename))):
+            keys[table] = index
+    return keys
+
+# Function to build the key indexes of tables (every table by default) from the files in output_dir,
+# falling back to the defaults for the others
+def output_keys(output_dir, tables=None):
+    return {**default_keys(), **file_keys(output_dir, tables)}
+
+# Function to read the line terminator of a CSV file from its header line, and whether its last line is terminated
+# Files that do not exist yet or are empty get csv.writer's default '\r\n'
+def csv_line_ending(filename):
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        return '\r\n', True
+
+    with open(filename, 'rb') as csvfile:
+        header = csvfile.readline()
+        csvfile.seek(-1, os.SEEK_END)
+        terminated = csvfile.read(1) == b'\n'
+    return ('\r\n' if header.endswith(b'\r\n') else '\n'), terminated
+
+# Function to append num_rows new rows to a table's CSV file, resuming after its highest id
+# The new rows are first written on their own to delta_filename (a temporary file next to filename when none is given),
+# in the file's line terminator, then copied onto the end of filename; both are streamed in batches of batch_size rows
+# With validation_keys ({parent: key index}) the new rows are checked on the way, foreign keys against validation_keys,
+# and nothing is appended if any fail
+def append_delta(table, filename, num_rows, delta_filename=None, keys=None, seed=None, batch_size=10_000, validation_keys=None):
+    fieldnames = db_tables[table][1]
+    rows, table_fake, table_rng = row_source(table, seed)
+    start = next_row_num(table, last_id_in_csv(filename, table))
+    new_rows = rows(start, start + num_rows, table_fake, table_rng, keys)
+
+    report = None
+    if validation_keys is not None:
+        report = ValidationReport()
+        new_rows = validated_rows(new_rows, Validator(table, validation_keys, report), batch_size)
+
+    write_header = not os.path.exists(filename) or os.path.getsize(filename) == 0
+    lineterminator, terminated = csv_line_ending(filename)
+    staged_filename = delta_filename or f'{filename}.tmp'
+
+    try:
+        with open(staged_filename, 'w', newline='') as stagedfile:
+            csvwriter = csv.writer(stagedfile, lineterminator=lineterminator)
+            csvwriter.writerow(fieldnames)
+            num_new_rows = 0
+            while batch := list(itertools.islice(new_rows, batch_size)):
+                csvwriter.writerows(batch)
+                num_new_rows += len(batch)
+    except BaseException:
+        os.remove(staged_filename)
+        raise
+
+    if report:
+        os.remove(staged_filename)
+        raise ValueError(f'rows generated for {filename} failed validation, nothing was appended\n{report.summary()}')
+
+    try:
+        with open(staged_filename, 'rb') as stagedfile, open(filename, 'ab') as csvfile:
+            header = stagedfile.readline()
+            if write_header:
+                csvfile.write(header)
+            elif not terminated:
+                csvfile.write(lineterminator.encode())
+            shutil.copyfileobj(stagedfile, csvfile, 1 << 20)
+    finally:
+        if not delta_filename:
+            os.remove(staged_filename)
+
+    return num_new_rows
+
+
+# %% reproducible rows
+
+# Faker reseeded for every row seeded_rows generates
+row_fake = Lazy(new_faker)
+
+# Function to find the rows [first, stop) generated together with row_num
+# The paired rows of the first 50 orders share a payment method and must not repeat a product, so they are seeded per order
+def row_group(table, row_num):
+    if table == 'order' and row_num <= 100:
+        first = row_num - (row_num - 1) % 2
+        return first, first + 2
+    return row_num, row_num + 1
+
+# Function to generate the rows [start, stop) of a table with every row's values drawn from (seed, table, row number) alone,
+# so any row or range comes out the same however the table is split up or which rows were generated before it
+# fake and rng are reseeded before every row
+def seeded_rows(table, start, stop, seed=0, keys=None, fake=None, rng=None):
+    rows = db_tables[table][2]
+    fake = fake if fake is not None else row_fake
+    rng = rng if rng is not None else random.Random()
+
+    row_num = start
+    while row_num < stop:
+        first, group_stop = row_group(table, row_num)
+        rng.seed(f'{seed}:{table}:{first}')
+        fake.seed_instance(rng.getrandbits(64))
+
+        for group_row_num, row in zip(range(first, group_stop), rows(first, group_stop, fake, rng, keys)):
+            if start <= group_row_num < stop:
+                yield row
+        row_num = group_stop
+
+# Function to regenerate the single row row_num of a table
+def seeded_row(table, row_num, seed=0, keys=None):
+    return next(seeded_rows(table, row_num, row_num + 1, seed, keys))
+
+# Function to regenerate the rows holding the ids first_id to last_id (inclusive), e.g. ('order', 'on00040', 'on00060')
+def seeded_id_range(table, first_id, last_id, seed=0, keys=None):
+    start = next_row_num(table, id_num(table, first_id) - 1)
+    stop = next_row_num(table, id_num(table, last_id))
+    return seeded_rows(table, start, stop, seed, keys)
+
+# Function to write a table to a CSV file with seeded_rows
+# With pools (see load_pools) names, streets, zip codes and companies come from the cached pools, drawn with the row's seed
+def write_seeded(filename, table, num_rows, seed=0, keys=None, pools=None):
+    rows, table_fake, table_rng = row_source(table, seed)
+    write_table(filename, table, db_tables[table][1], rows, num_rows, PoolFaker(pools, table_fake) if pools else table_fake, table_rng, keys)
+
+# Function to pick a table's row generator with the faker and random generator to call it with:
+# the shared ones, or a private pair reseeded for every row from (seed, table, row number) when a seed is given
+def row_source(table, seed=None):
+    if seed is None:
+        return db_tables[table][2], fake, random
+
+    def rows(start, stop, fake, rng, keys):
+        return seeded_rows(table, start, stop, seed, keys, fake, rng)
+    return rows, row_fake, random.Random()
+
+
+# %% columnar output
+
+# Arrow type of every non-text column; all other columns are strings
+arrow_column_types = {
+    'date_of_birth': 'date32',
+    'discount_start_date': 'date32',
+    'discount_end_date': 'date32',
+    'order_date': 'date32',
+    'price': 'float64',
+    'weight': 'float64',
+    'discount_percentage': 'float64',
+    'shipment_cost': 'float64',
+    'inventory': 'int32',
+    'product_views': 'int32',
+    'quantity': 'int32',
+    'customer_rating': 'int32',
+    'shipment_delay_days': 'int32',
+}
 
-            csvwriter.writerow({
-                'order_number': order_number,
-                'payment_method': payment_method,
-                'order_date': order_date,
-                'quantity': quantity,
-                'review': review,
-                'customer_id': customer_id,
-                'product_id': product_id,
-                'shipment_id': shipment_id,
-                'customer_rating': customer_rating
-            })
+# Date columns not written as yyyy-mm-dd
+arrow_date_formats = {
+    'date_of_birth': '%d/%m/%Y',
+}
 
-# Call the function to generate and save order data to a CSV file
-generate_order_data('order.csv', num_orders=500)
+# Function to build the Arrow schema of a table
+def arrow_schema(table):
+    return pa.schema([(name, getattr(pa, arrow_column_types.get(name, 'string'))())
+                      for name in db_tables[table][1]])
+
+# Function to collect a stream of row tuples into column batches of batch_size rows
+def row_batches(rows, fieldnames, batch_size=100_000):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        yield dict(zip(fieldnames, map(list, zip(*batch))))
+
+# Function to turn one batch of columns into a typed Arrow record batch
+def arrow_batch(table, columns):
+    schema = arrow_schema(table)
+    arrays = []
+    for field in schema:
+        if field.type == pa.date32():
+            # Parse the whole date column at once instead of one strptime per row
+            dates = pc.strptime(pa.array(columns[field.name], pa.string()), format=arrow_date_formats.get(field.name, '%Y-%m-%d'), unit='s')
+            arrays.append(dates.cast(pa.date32()))
+        else:
+            arrays.append(pa.array(columns[field.name], field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+# Function to lazily yield a table as Arrow record batches,
+# from the column engine where the table has one and from the row generator otherwise
+def arrow_batches(table, num_rows, seed=None, batch_size=100_000, keys=None, workload=None, pool_size=None):
+    if table == 'order' and workload is not None:
+        batches = workload_order_batches(num_rows, workload, seed, batch_size, keys)
+    elif table in batched_tables:
+        batches = column_batches(table, num_rows, seed, batch_size, pool_size, keys)
+    else:
+        rows, table_fake, table_rng = row_source(table, seed)
+        if metrics is not None:
+            table_fake = Timed(table_fake, metrics, f'{table}.faker')
+            table_rng = Timed(table_rng, metrics, f'{table}.random')
+        batches = row_batches(rows(1, num_rows + 1, table_fake, table_rng, keys), db_tables[table][1], batch_size)
+
+    if metrics is not None:
+        batches = timed_batches(batches, metrics, table)
+    if validation is not None:
+        batches = map(Validator(table, validation_keys, validation).check, batches)
+    for columns in batches:
+        yield arrow_batch(table, columns)
+
+# Function to generate a table as an in-memory Arrow table for in-process consumers
+# The record batches are handed over as they are, without copying
+def arrow_table(table, num_rows, seed=None, batch_size=100_000, keys=None):
+    return pa.Table.from_batches(arrow_batches(table, num_rows, seed, batch_size, keys), schema=arrow_schema(table))
+
+# Function to generate a table into a Parquet file, one row group per batch, instrumented when metrics is set
+def write_parquet(table, filename, num_rows, seed=None, batch_size=100_000, keys=None, workload=None, pool_size=None):
+    started = time.perf_counter()
+    with pq.ParquetWriter(filename, arrow_schema(table)) as writer:
+        if metrics is not None:
+            writer = Timed(writer, metrics, f'{table}.disk')
+        for batch in arrow_batches(table, num_rows, seed, batch_size, keys, workload, pool_size):
+            writer.write_batch(batch)
+
+    if metrics is not None:
+        table_done(metrics, table, started)
+
+
+# %% generate all tables
+
+# Every table with its generator and default file name, parents before children
+table_generators = {
+    'customer': (customer, 'customer.csv'),
+    'seller': (seller, 'seller.csv'),
+    'category': (category, 'category.csv'),
+    'product': (product, 'product.csv'),
+    'discount': (discount, 'discount.csv'),
+    'order': (generate_order_data, 'order.csv'),
+    'shipment': (shipment, 'shipment.csv'),
+}
 
+# File name suffix of each compression of the CSV files
+compression_suffixes = {'gzip': '.gz', 'zstd': '.zst'}
+
+# Rows per unit of scale factor, TPC style: SF=1 is 10k customers, 1k sellers and 10k products with 100k order rows,
+# SF=100 a catalogue of 1M products across 100k sellers
+scale_factor_rows = {
+    'customer': 10_000,
+    'seller': 1_000,
+    'product': 10_000,
+    'discount': 2_000,
+    'order': 100_000,
+}
 
-# %% shipment
-def shipment(filename, num_shipments=450):
-    fieldnames = ['shipment_id', 'shipment_delay_days', 'shipment_cost', 'order_number', 'refund']
+# Function to derive every table's row count from a scale factor
+def scale_factor_tables(scale_factor):
+    tables = {table: max(round(num_rows * scale_factor), 1) for table, num_rows in scale_factor_rows.items()}
+
+    # Categories grow with the square root of the scale factor, as sub-lines of the hand-written categories
+    tables['category'] = len(category_items) * max(math.ceil(math.sqrt(scale_factor)), 1)
+
+    # One shipment per order
+    tables['shipment'] = last_id_for_rows('order', tables['order'])
+
+    return {table: tables[table] for table in table_generators}
+
+# Row counts used when a table is generated without one
+default_config = {
+    'output_dir': '.',
+    'format': 'csv',
+    'workload': None,
+    'pool_size': None,
+    'seed': None,
+    'compression': None,
+    'workers': 1,
+    'id_width': None,
+    'scale_factor': None,
+    'validate': False,
+    'shard_size': None,
+    'engine': 'rows',
+    'tables': {
+        'customer': 500,
+        'seller': 500,
+        'category': 17,
+        'product': 51,
+        'discount': 500,
+        'order': 500,
+        'shipment': 450,
+    },
+}
 
-    with open(filename, 'w', newline='') as csvfile:
-        csvwriter = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        # Write the header
-        csvwriter.writeheader()
-
-        # Generate and write shipment data to the CSV file
-        for shipment_id_num in range(1, num_shipments + 1):
-            shipment_id = f'sh{shipment_id_num:05}'  # Format shipment_id as 'sh' followed by 5-digit number
-            
-            # Reference order_number from the existing order data
-            order_number = f'on{shipment_id_num:05}'  # Assuming order_number follows the same pattern
-
-            shipment_delay_days = fake.random_int(min=1, max=3)  
-            shipment_cost = round(random.uniform(1, 4), 1)
-            
-            # 5% chance of 'Yes', 95% chance of 'No'
-            refund = 'Yes' if fake.random_int(min=1, max=100) <= 5 else 'No'
-
-            csvwriter.writerow({
-                'shipment_id': shipment_id,
-                'shipment_delay_days': shipment_delay_days,
-                'shipment_cost': shipment_cost,
-                'order_number': order_number,
-                'refund': refund
-            })
-
-# Call the function to generate and save shipment data to a CSV file
-shipment('shipment.csv', num_shipments=450)
+# Database whose schema the table dependencies are read from
+schema_database = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Ecommerce.db')
+
+# Function to read the parents of every table from the foreign keys in the database schema
+# Only keys to tables generated earlier count: Order.shipment_id is derived from the order number, not drawn from Shipment
+def table_parents(database=schema_database):
+    tables = list(table_generators)
+    db_names = {db_tables[table][0]: table for table in tables}
+    parents = {table: set() for table in tables}
+
+    connection = sqlite3.connect(f'file:{database}?mode=ro', uri=True)
+    try:
+        for table in tables:
+            for foreign_key in connection.execute(f'PRAGMA foreign_key_list("{db_tables[table][0]}")'):
+                parent = db_names.get(foreign_key[2])
+                if parent is not None and tables.index(parent) < tables.index(table):
+                    parents[table].add(parent)
+    finally:
+        connection.close()
+
+    return parents
+
+# Function to tell whether a table is generated in shards of config['shard_size'] rows (see generate_sharded)
+# Only CSV is sharded, and workload orders are drawn basket by basket, which does not split by id range
+def is_sharded(table, config):
+    return bool(config['shard_size']) and table in sharded_tables and config['format'] == 'csv' and (table != 'order' or config['workload'] is None)
+
+# Function to tell whether a table is written as CSV by the NumPy column engine (see generate_batched)
+# Parquet output already uses the column engine where a table has one, and workload orders have their own batches
+def is_batched(table, config):
+    return config['engine'] == 'batched' and table in batched_tables and config['format'] == 'csv' and (table != 'order' or config['workload'] is None)
+
+# Function to generate one table into filename, as CSV or Parquet, drawing foreign keys from keys
+# With config['validate'] the rows are checked as they are written (see Validator), failing the table if any are invalid;
+# foreign keys are checked against the ids in the parent files next to filename
+def generate_table(table, filename, num_rows, keys, config):
+    global validation, validation_keys
+
+    # Worker processes started with spawn do not inherit the id widths set by generate_all
+    with id_widths(config):
+        generator = table_generators[table][0]
+        pools = load_pools(pool_size=config['pool_size']) if table in ('customer', 'seller') and config['pool_size'] else None
+
+        # Without a shipment count, or under a workload, where the number of orders is only known once they are written,
+        # every order gets one shipment; a given count is checked before any file is opened
+        if table == 'shipment':
+            if num_rows is None or config['workload'] is not None:
+                num_rows = unshipped_orders(keys)
+            check_shipment_count(num_rows, keys['order'])
+
+        validation = ValidationReport() if config['validate'] else None
+        if validation is not None:
+            validation_keys = file_keys(os.path.dirname(filename), set(foreign_keys.get(table, {}).values()))
+        try:
+            if is_sharded(table, config):
+                generate_sharded(table, filename, num_rows, config['seed'], config['shard_size'], config['workers'],
+                                 keys=keys, pool_size=config['pool_size'], report=validation, validation_keys=validation_keys)
+            elif is_batched(table, config):
+                generate_batched(table, filename, num_rows, seed=config['seed'], pool_size=config['pool_size'], keys=keys)
+            elif config['format'] == 'parquet':
+                write_parquet(table, filename, num_rows, seed=config['seed'], keys=keys, workload=config['workload'], pool_size=config['pool_size'])
+            elif config['seed'] is not None and (table != 'order' or config['workload'] is None):
+                write_seeded(filename, table, num_rows, config['seed'], keys, pools)
+            elif table == 'order':
+                generator(filename, num_rows, keys, config['workload'], config['seed'])
+            elif pools:
+                generator(filename, num_rows, keys, pools)
+            else:
+                generator(filename, num_rows, keys)
+        finally:
+            report, validation, validation_keys = validation, None, {}
+
+        if report:
+            raise ValueError(f'rows written to {filename} failed validation\n{report.summary()}')
+
+        return filename
+
+# Function to tell whether a table's key index is known from its row count before it is generated
+# With a workload the number of orders depends on the basket sizes drawn, so it is only known afterwards,
+# and so is the number of shipments, one per order; without a shipment count the shipments also follow the orders
+def keys_known_up_front(table, config):
+    if table == 'shipment' and config['tables'].get('shipment') is None:
+        return False
+    return not (table in ('order', 'shipment') and config['workload'] is not None)
+
+# Function to build the key index of a generated table
+def table_key_index(table, filename, num_rows, config):
+    if keys_known_up_front(table, config):
+        return key_index(table, last_id_for_rows(table, num_rows))
+    return key_index(table, last_id_in_file(filename, table))
+
+# Faker and random are reseeded in every worker process, as forked workers would otherwise share their state
+def init_table_worker():
+    random.seed()
+    fake.seed_instance()
+
+# Function to generate the tables of jobs ({table: (filename, num_rows)}) in a process pool
+# A table is started as soon as the key indexes of all its parents are known, so independent tables run side by side
+def generate_scheduled(jobs, keys, config, workers=None, parents=None):
+    # process pool for the table jobs, imported here to keep module import cheap
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    parents = table_parents() if parents is None else parents
+
+    # Key indexes that only exist once their table is written; every other one is filled in straight away
+    pending_keys = {table for table in jobs if not keys_known_up_front(table, config)}
+    for table, (filename, num_rows) in jobs.items():
+        if table not in pending_keys:
+            keys[table] = table_key_index(table, filename, num_rows, config)
+
+    # Validated tables check their foreign keys against the parent files, so they also wait for their parents to be written
+    unwritten = set(jobs)
+    blocking = unwritten if config['validate'] else pending_keys
+
+    waiting = list(jobs)
+    running = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_table_worker) as pool:
+        while waiting or running:
+            for table in [table for table in waiting if not parents[table] & blocking]:
+                waiting.remove(table)
+                filename, num_rows = jobs[table]
+                running[pool.submit(generate_table, table, filename, num_rows, dict(keys), config)] = table
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                table = running.pop(future)
+                future.result()
+                unwritten.discard(table)
+                if table in pending_keys:
+                    filename, num_rows = jobs[table]
+                    keys[table] = table_key_index(table, filename, num_rows, config)
+                    pending_keys.discard(table)
+
+    return keys
+
+# Function to generate the tables named in config['tables'] ({table: num_rows}) into config['output_dir'] as CSV or Parquet files
+# With config['workers'] above 1 the tables are generated concurrently (see generate_scheduled)
+def generate_all(config=None):
+    config = {**default_config, **(config or {})}
+    output_dir = config['output_dir']
+    os.makedirs(output_dir, exist_ok=True)
+
+    # With a scale factor and no row counts of its own, the config takes every row count from the scale factor
+    if config['scale_factor'] and config['tables'] is default_config['tables']:
+        config['tables'] = scale_factor_tables(config['scale_factor'])
+    with id_widths(config):
+        # Child tables draw their foreign keys from the parent tables generated here,
+        # or from the ids in the parent files already in output_dir, plain, compressed or Parquet
+        keys = output_keys(output_dir, [table for table in table_generators if table not in config['tables']])
+
+        jobs = {}
+        for table, (_, filename) in table_generators.items():
+            if table not in config['tables']:
+                continue
+
+            if config['format'] == 'parquet':
+                filename = filename.replace('.csv', '.parquet')
+            elif config['compression']:
+                # CSV files are compressed on the writer threads, as <table>.csv.gz or <table>.csv.zst
+                filename += compression_suffixes[config['compression']]
+            jobs[table] = (os.path.join(output_dir, filename), config['tables'][table])
+
+        if config['workers'] > 1:
+            # Build the pool cache once up front rather than in every worker
+            if config['pool_size'] and {'customer', 'seller'} & set(jobs):
+                load_pools(pool_size=config['pool_size'])
+            generate_scheduled(jobs, keys, config, config['workers'])
+        else:
+            for table, (filename, num_rows) in jobs.items():
+                generate_table(table, filename, num_rows, keys, config)
+                keys[table] = table_key_index(table, filename, num_rows, config)
+
+        return [filename for filename, _ in jobs.values()]
+
+# Function to parse the command line into a generate_all config
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate the synthetic e-commerce CSV files.')
+    parser.add_argument('--output-dir', default=default_config['output_dir'], help='directory the CSV files are written to')
+    parser.add_argument('--tables', nargs='+', choices=list(table_generators), default=list(table_generators), help='tables to generate')
+    parser.add_argument('--rows', nargs='+', default=[], metavar='TABLE=N', help='row count for a table, e.g. customer=1000')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=default_config['format'], help='file format of the generated tables')
+    parser.add_argument('--compression', choices=list(compression_suffixes), help='compress the CSV files (zstd needs the zstandard package)')
+    parser.add_argument('--pool-size', type=int, help='draw customer and seller names, streets, zip codes and companies from cached pools of this size')
+    parser.add_argument('--seed', type=int, help='generate reproducible rows, each drawn from (seed, table, row number) alone')
+    parser.add_argument('--workload', action='store_true', help='skew customers, products, order dates and basket sizes (see default_workload)')
+    parser.add_argument('--scale-factor', type=float, help='derive every row count from a scale factor, e.g. 1, 10 or 100 (see scale_factor_rows); --rows still overrides')
+    parser.add_argument('--id-width', type=int, help='digits in customer, seller, discount, order and shipment ids (default 5, up to 99,999 rows)')
+    parser.add_argument('--workers', type=int, default=default_config['workers'], help='generate independent tables concurrently in this many processes')
+    parser.add_argument('--engine', choices=['rows', 'batched'], default=default_config['engine'], help='write customer, product, discount, order and shipment CSV files with the per-row Faker generators or the NumPy column engine')
+    parser.add_argument('--shard-size', type=int, help='split customer, seller and order into shards of this many rows, generated across --workers processes')
+    parser.add_argument('--profile', action='store_true', help='report progress and a per-stage timing breakdown on stderr')
+    parser.add_argument('--database', help='load the rows straight into this SQLite database instead of writing CSV files')
+    parser.add_argument('--delta', action='store_true', help='append --rows new rows after the highest existing id instead of regenerating the tables')
+    parser.add_argument('--refresh-summaries', action='store_true', help='only fold rows loaded by other tools into the summary tables of --database')
+    parser.add_argument('--validate', action='store_true', help='check the rows as they are generated or loaded, failing on any invalid row')
+    parser.add_argument('--check', action='store_true', help='only check the CSV files of --tables in --output-dir and print the error report')
+    args = parser.parse_args(argv)
+
+    rows = scale_factor_tables(args.scale_factor) if args.scale_factor else dict(default_config['tables'])
+    # Without a shipment= entry every order gets one shipment, however many orders there are
+    rows['shipment'] = None
+    for entry in args.rows:
+        table, _, num_rows = entry.partition('=')
+        if table not in table_generators or not num_rows.isdigit():
+            parser.error(f'invalid --rows entry: {entry}')
+        rows[table] = int(num_rows)
+
+    if args.refresh_summaries and not args.database:
+        parser.error('--refresh-summaries needs --database')
+    if args.delta and set(args.tables) - set(id_width_tables):
+        parser.error(f'--delta only supports the tables {", ".join(id_width_tables)}')
+
+    return {'output_dir': args.output_dir, 'format': args.format, 'workload': default_workload if args.workload else None, 'pool_size': args.pool_size,
+            'seed': args.seed, 'compression': args.compression, 'workers': args.workers, 'id_width': args.id_width,
+            'scale_factor': args.scale_factor, 'validate': args.validate, 'shard_size': args.shard_size, 'engine': args.engine, 'check': args.check,
+            'database': args.database, 'delta': args.delta, 'refresh_summaries': args.refresh_summaries, 'profile': args.profile,
+            'tables': {table: rows[table] for table in args.tables}}
+
+# Function to print instrumentation events on stderr
+def print_event(event):
+    if event['event'] == 'progress':
+        print(f"{event['table']}: {event['rows']} rows, {event['rows_per_sec']:.0f} rows/sec", file=sys.stderr)
+    elif event['event'] == 'done':
+        stages = ', '.join(f'{stage} {seconds:.3f}s' for stage, seconds in event['breakdown'].items())
+        print(f"{event['table']}: {event['rows']} rows in {event['seconds']:.3f}s ({stages})", file=sys.stderr)
+
+def main(argv=None):
+    global metrics
+    config = parse_args(argv)
+
+    if config['profile']:
+        metrics = Metrics(print_event)
+    with id_widths(config):
+        if config['check']:
+            report = validate_files(config['output_dir'], config['tables'])
+            print(report.summary() or 'no invalid rows')
+            return 1 if report else 0
+        elif config['refresh_summaries']:
+            refresh_summaries(config['database'])
+        elif config['database']:
+            for table, num_rows in load_database(config['database'], config['tables'], replace=not config['delta'], validate=config['validate'], seed=config['seed']).items():
+                print(f'{db_tables[table][0]}: {num_rows} rows')
+        elif config['delta']:
+            # New rows go to <table>_new_records.csv and are appended to <table>.csv
+            keys = output_keys(config['output_dir'])
+            for table in table_generators:
+                if table not in config['tables']:
+                    continue
+                filename = os.path.join(config['output_dir'], table_generators[table][1])
+                if table_file(config['output_dir'], table) not in (None, filename):
+                    raise ValueError(f'--delta only appends to plain CSV files, {table} is in {table_file(config["output_dir"], table)}')
+                delta_filename = filename.replace('.csv', '_new_records.csv')
+                # With --validate foreign keys are checked against the ids in the parent files, not the keys drawn from
+                validation_keys = file_keys(config['output_dir'], set(foreign_keys.get(table, {}).values())) if config['validate'] else None
+                # Without a shipment count the orders that have no shipment yet get one each
+                num_rows = config['tables'][table]
+                if num_rows is None:
+                    num_rows = unshipped_orders(keys, last_id_in_csv(filename, table))
+                append_delta(table, filename, num_rows, delta_filename, keys, config['seed'], validation_keys=validation_keys)
+                keys.update(file_keys(config['output_dir'], [table]))
+                print(delta_filename)
+        else:
+            for filename in generate_all(config):
+                print(filename)
+
+
+if __name__ == '__main__':
+    sys.exit(main())